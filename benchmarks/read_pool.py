@@ -0,0 +1,74 @@
+"""
+Compare serial and pooled file reading in concatenate_files.
+
+Creates a synthetic tree in a temporary directory and concatenates it once with a
+single reader and once with a thread pool. Use --latency-ms to add an artificial
+delay to every open() and approximate a network filesystem (NFS/SMB).
+
+    python benchmarks/read_pool.py --files 2000 --latency-ms 5 --workers 8
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import concatenator  # noqa: E402
+
+
+def make_tree(root: str, file_count: int, file_size: int) -> list:
+    line = "value = 'synthetic benchmark content'\n"
+    content = line * max(1, file_size // len(line))
+    paths = []
+    for i in range(file_count):
+        directory = os.path.join(root, f"pkg{i // 100:03d}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"module{i:05d}.py")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        paths.append(path)
+    return paths
+
+
+def slow_open(latency: float):
+    def _open(*args, **kwargs):
+        time.sleep(latency)
+        return open(*args, **kwargs)
+    return _open
+
+
+def time_concatenate(paths: list, workers: int) -> float:
+    start = time.perf_counter()
+    concatenator.concatenate_files(paths, workers=workers)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=2000, help="number of files to create")
+    parser.add_argument('--size', type=int, default=4096, help="approximate size of each file in bytes")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="artificial delay added to every open()")
+    parser.add_argument('--workers', type=int, default=8, help="reader threads for the pooled run")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='concat-bench-')
+    try:
+        paths = make_tree(root, args.files, args.size)
+        if args.latency_ms:
+            concatenator.open = slow_open(args.latency_ms / 1000.0)
+        serial = time_concatenate(paths, 1)
+        pooled = time_concatenate(paths, args.workers)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"files: {args.files}, size: {args.size} B, latency: {args.latency_ms} ms")
+    print(f"serial:            {serial:8.3f} s  ({args.files / serial:10.1f} files/s)")
+    print(f"pooled ({args.workers:2d} threads): {pooled:8.3f} s  ({args.files / pooled:10.1f} files/s)")
+    print(f"speedup: {serial / pooled:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
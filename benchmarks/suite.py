@@ -0,0 +1,294 @@
+"""
+Benchmark suite for the concatenation and rendering pipeline.
+
+Creates a synthetic tree of configurable depth, fan-out, file count and file size
+in a temporary directory and measures:
+
+  walk            iter_matching_files over the tree
+  workspace_scan  Workspace.scan with each top-level directory as a root, walked in parallel
+  concat_cold     concatenate_files with no cache
+  concat_warm     concatenate_files with a warm FileContentCache
+  render          markdown to HTML conversion of every file chunk
+  select_all      MainWindow._traverse_and_set on the root (GUI, offscreen)
+  toggle          one checkbox toggle until the preview is updated (GUI, offscreen)
+  extensions      CheckableFileSystemModel.update_extensions (GUI, offscreen)
+
+Each result reports wall time, throughput (files/s, MB/s) where it applies and the
+peak Python heap (tracemalloc). Results are written as JSON so two versions can be
+compared:
+
+    python benchmarks/suite.py --files 5000 --depth 4 -o before.json
+    python benchmarks/suite.py --files 5000 --depth 4 -o after.json --compare before.json
+
+Metrics ending in _s or _ms are lower-is-better, metrics ending in _per_s are
+higher-is-better; --compare exits with status 1 if any of them regressed by more
+than --threshold percent.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import concatenator  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def make_tree(root: str, file_count: int, file_size: int, depth: int, fanout: int) -> List[str]:
+    """
+    Create file_count files of about file_size bytes spread over a tree of directories
+    depth levels deep with fanout subdirectories per level. Half of the files are .py
+    and half .js, plus one .txt per directory that the default filters exclude.
+    """
+    directories = [root]
+    level = [root]
+    for d in range(depth):
+        level = [os.path.join(parent, f"d{d}_{i}") for parent in level for i in range(fanout)]
+        directories.extend(level)
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'notes.txt'), 'w', encoding='utf-8') as f:
+            f.write("not selected\n")
+
+    line = "value = compute('synthetic benchmark content', 42)\n"
+    content = line * max(1, file_size // len(line))
+    paths = []
+    for i in range(file_count):
+        directory = directories[i % len(directories)]
+        path = os.path.join(directory, f"module{i:06d}.{'py' if i % 2 == 0 else 'js'}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        paths.append(path.replace(os.sep, '/'))
+    return paths
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Tuple[float, int, Any]:
+    """
+    Run fn repeat times and return (best wall time in seconds, peak traced bytes, last result).
+    """
+    best = float('inf')
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = min(best, elapsed)
+    return best, peak, result
+
+
+def throughput(seconds: float, files: int, total_bytes: int) -> Dict[str, float]:
+    seconds = max(seconds, 1e-9)
+    return {
+        'time_s': round(seconds, 6),
+        'files_per_s': round(files / seconds, 1),
+        'mb_per_s': round(total_bytes / seconds / (1024 * 1024), 2),
+    }
+
+
+def bench_core(root: str, paths: List[str], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+
+    seconds, peak, found = measure(lambda: list(concatenator.iter_matching_files(
+        root, concatenator.DEFAULT_EXTENSIONS, concatenator.DEFAULT_HIDDEN_DIRS)), repeat)
+    results['walk'] = {'time_s': round(seconds, 6), 'files_per_s': round(len(found) / max(seconds, 1e-9), 1),
+                       'peak_bytes': peak}
+
+    workspace = concatenator.Workspace(sorted(entry.path for entry in os.scandir(root) if entry.is_dir()))
+    seconds, peak, found = measure(lambda: workspace.scan(concatenator.DEFAULT_EXTENSIONS,
+                                                          concatenator.DEFAULT_HIDDEN_DIRS), repeat)
+    results['workspace_scan'] = {'time_s': round(seconds, 6), 'files_per_s': round(len(found) / max(seconds, 1e-9), 1),
+                                 'roots': len(workspace.roots), 'peak_bytes': peak}
+
+    seconds, peak, content = measure(lambda: concatenator.concatenate_files(paths), repeat)
+    results['concat_cold'] = dict(throughput(seconds, len(paths), total_bytes), peak_bytes=peak,
+                                  output_bytes=len(content[0]))
+
+    cache = concatenator.FileContentCache(max_bytes=1 << 40)
+    concatenator.concatenate_files(paths, cache=cache)
+    seconds, peak, _ = measure(lambda: concatenator.concatenate_files(paths, cache=cache), repeat)
+    results['concat_warm'] = dict(throughput(seconds, len(paths), total_bytes), peak_bytes=peak)
+
+    chunks = [markdown_chunk for _, markdown_chunk, _ in concatenator.iter_file_chunks(paths, cache=cache)]
+    markdown_bytes = sum(len(chunk) for chunk in chunks)
+
+    def render() -> int:
+        converter = concatenator.new_markdown_converter()
+        return sum(len(concatenator.render_markdown_chunk(chunk, None, converter)) for chunk in chunks)
+
+    seconds, peak, _ = measure(render, repeat)
+    results['render'] = dict(throughput(seconds, len(chunks), markdown_bytes), peak_bytes=peak)
+    return results
+
+
+def bench_gui(root: str, paths: List[str], repeat: int, toggles: int) -> Dict[str, Dict[str, Any]]:
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import QSettings, Qt
+    from PyQt5.QtWidgets import QApplication
+
+    import explorer
+
+    app = QApplication.instance() or QApplication([])
+    settings_dir = tempfile.mkdtemp(prefix='concat-bench-settings-')
+    settings = QSettings(os.path.join(settings_dir, 'settings.ini'), QSettings.IniFormat)
+    settings.setValue('persistent_index', False)
+    settings.setValue('max_watched_files', 0)
+    settings.setValue('update_delay_ms', 0)
+
+    def wait_for_render(window: Any) -> None:
+        window.update_scheduler.flush()
+        while window._render_task is not None:
+            app.processEvents()
+            time.sleep(0.0005)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    cwd = os.getcwd()
+    os.chdir(root)
+    window = explorer.MainWindow(settings)
+    try:
+        app.processEvents()
+        root_index = window.model.index(window.model.rootPath())
+
+        def select_all() -> int:
+            window.model.set_checked_many(list(window.model.checked_files), Qt.Unchecked)
+            window._traverse_and_set(root_index, Qt.Checked)
+            return len(window.model.checked_files)
+
+        seconds, peak, checked = measure(select_all, repeat)
+        results['select_all'] = {'time_s': round(seconds, 6), 'files_per_s': round(checked / max(seconds, 1e-9), 1),
+                                 'peak_bytes': peak}
+
+        # Warm the caches so each toggle measures the incremental rebuild
+        wait_for_render(window)
+        latencies = []
+        for i in range(toggles):
+            index = window.model.index(paths[i % len(paths)])
+            state = Qt.Unchecked if window.model.data(index, Qt.CheckStateRole) == Qt.Checked else Qt.Checked
+            start = time.perf_counter()
+            window.model.setData(index, state, Qt.CheckStateRole)
+            wait_for_render(window)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if latencies:
+            latencies.sort()
+            results['toggle'] = {
+                'median_ms': round(statistics.median(latencies), 3),
+                'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                'max_ms': round(latencies[-1], 3),
+                'toggles': len(latencies),
+            }
+
+        def update_extensions() -> None:
+            window.model.update_extensions(['*.py'])
+            window.model.update_extensions(concatenator.DEFAULT_EXTENSIONS)
+
+        seconds, peak, _ = measure(update_extensions, repeat)
+        results['extensions'] = {'time_s': round(seconds, 6), 'peak_bytes': peak}
+    finally:
+        window.close()
+        os.chdir(cwd)
+        shutil.rmtree(settings_dir, ignore_errors=True)
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Print every metric next to its baseline and return the names of regressed metrics.
+    """
+    regressions = []
+    for bench, metrics in current['results'].items():
+        base_metrics = baseline.get('results', {}).get(bench, {})
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if not isinstance(base, (int, float)) or not base:
+                continue
+            change = (value - base) / base * 100
+            if metric.endswith('_per_s'):
+                regressed = change < -threshold
+            elif metric.endswith('_s') or metric.endswith('_ms'):
+                regressed = change > threshold
+            else:
+                regressed = False
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{bench + '.' + metric:28s} {base:14,.3f} -> {value:14,.3f}  ({change:+7.1f}%){flag}")
+            if regressed:
+                regressions.append(f"{bench}.{metric}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=2000, help="number of files to create")
+    parser.add_argument('--size', type=int, default=4096, help="approximate size of each file in bytes")
+    parser.add_argument('--depth', type=int, default=3, help="directory levels below the root")
+    parser.add_argument('--fanout', type=int, default=4, help="subdirectories per directory")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark; the best time is kept")
+    parser.add_argument('--toggles', type=int, default=20, help="checkbox toggles timed by the toggle benchmark")
+    parser.add_argument('--no-gui', action='store_true', help="skip the benchmarks that need PyQt5")
+    parser.add_argument('-o', '--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare against a previous JSON result")
+    parser.add_argument('--threshold', type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='concat-bench-')
+    try:
+        paths = make_tree(root, args.files, args.size, args.depth, args.fanout)
+        results = bench_core(root, paths, args.repeat)
+        if not args.no_gui:
+            results.update(bench_gui(root, paths, args.repeat, args.toggles))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None,
+        },
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2223 @@
+"""
+Headless file concatenation: the reading, caching and rendering logic shared by the
+File Concatenator GUI (explorer.py) and its command line mode.
+
+This module does not import PyQt5, and imports markdown only when HTML is rendered,
+so it starts quickly in CI jobs and on machines without a display server.
+
+    python concatenator.py ROOT --include '*.py' --include '*.js' --format plain -o out.txt
+"""
+
+import os
+import sys
+import mmap
+import re
+import time
+import fnmatch
+import json
+import hashlib
+import logging
+import sqlite3
+import argparse
+import threading
+import subprocess
+import contextlib
+
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from typing import List, Tuple, Optional, Any, Dict, Set, Iterable, Iterator, Callable, TextIO, Pattern
+
+DEFAULT_EXTENSIONS = ['*.py', '*.js']
+DEFAULT_HIDDEN_DIRS = ['__pycache__', '.git']
+
+# Files larger than this are excerpted (head and tail) instead of read in full; 0 disables the cap
+DEFAULT_MAX_FILE_BYTES = 2 * 1024 * 1024
+# Number of leading bytes inspected to tell binary files apart from text
+BINARY_SNIFF_BYTES = 8192
+
+# ----------------------------
+# Helper Functions
+# ----------------------------
+
+# Extension to fenced code block language; extend with register_languages()
+LANGUAGE_BY_EXTENSION: Dict[str, str] = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.json': 'json',
+    '.html': 'html',
+    '.qss': 'qss',
+    '.vue': 'vue'
+}
+
+
+def get_language_from_extension(ext: str) -> Optional[str]:
+    """
+    Map file extensions to programming languages for syntax highlighting.
+
+    :param ext: File extension (e.g., '.py', '.js').
+    :return: Corresponding language string or empty string if not found.
+    """
+    return LANGUAGE_BY_EXTENSION.get(ext.lower(), '')
+
+
+def register_languages(entries: Iterable[str]) -> None:
+    """
+    Add or override extension to language mappings.
+
+    :param entries: Strings of the form '.ext=language' (e.g., ['.ts=typescript', '.rs=rust']).
+    """
+    for entry in entries:
+        ext, separator, language = entry.partition('=')
+        ext = ext.strip().lower()
+        if not separator or not ext:
+            logging.error(f"Ignoring invalid language mapping: {entry}")
+            continue
+        if not ext.startswith('.'):
+            ext = '.' + ext
+        LANGUAGE_BY_EXTENSION[ext] = language.strip()
+
+
+class NameMatcher:
+    """
+    Compiled, case-insensitive matcher for file name filter patterns.
+
+    Patterns of the form '*<literal>' (e.g., '*.py') are checked with a single
+    str.endswith() on a tuple of suffixes; any other glob is folded into one combined
+    regular expression. Build it once per settings change and reuse it per path.
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.patterns = list(patterns)
+        suffixes = []
+        globs = []
+        for pattern in self.patterns:
+            pattern = pattern.lower()
+            literal = pattern[1:]
+            if pattern.startswith('*') and literal and not any(c in literal for c in '*?['):
+                suffixes.append(literal)
+            else:
+                globs.append(fnmatch.translate(pattern))
+        self._suffixes = tuple(suffixes)
+        self._regex = re.compile('|'.join(globs)) if globs else None
+
+    def matches(self, name: str) -> bool:
+        """
+        Return True if a file name (not a path) matches any of the patterns.
+        """
+        name = name.lower()
+        if self._suffixes and name.endswith(self._suffixes):
+            return True
+        return self._regex is not None and self._regex.match(name) is not None
+
+
+# ----------------------------
+# Ignore Rules
+# ----------------------------
+
+def _translate_gitignore_glob(glob: str) -> str:
+    """
+    Translate the path part of a .gitignore pattern to a regular expression.
+    """
+    parts = []
+    i = 0
+    length = len(glob)
+    while i < length:
+        c = glob[i]
+        if glob.startswith('**', i):
+            at_start = i == 0 or glob[i - 1] == '/'
+            at_end = i + 2 == length or glob[i + 2] == '/'
+            if at_start and at_end:
+                if i + 2 == length:
+                    parts.append('.*')          # trailing '/**': everything inside
+                    i += 2
+                else:
+                    parts.append('(?:.*/)?')    # '**/': zero or more directories
+                    i += 3
+                continue
+            parts.append('[^/]*')
+            i += 2
+        elif c == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif c == '?':
+            parts.append('[^/]')
+            i += 1
+        elif c == '[':
+            end = glob.find(']', i + 2 if glob.startswith('[!', i) or glob.startswith('[]', i) else i + 1)
+            if end == -1:
+                parts.append(re.escape(c))
+                i += 1
+                continue
+            body = glob[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif c == '\\' and i + 1 < length:
+            parts.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+    return ''.join(parts)
+
+
+def compile_gitignore_line(line: str) -> Optional[Tuple[Pattern, bool, bool]]:
+    """
+    Compile one line of a .gitignore file.
+
+    :param line: The raw line.
+    :return: (regex matched against the path relative to the .gitignore's directory,
+             negated, directory only), or None for blank lines and comments.
+    """
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+    # Trailing spaces are ignored unless escaped
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # A slash anywhere but at the end anchors the pattern to the .gitignore's directory
+    anchored = '/' in line
+    body = _translate_gitignore_glob(line.lstrip('/'))
+    regex = f"^{body}$" if anchored else f"^(?:.*/)?{body}$"
+    return re.compile(regex), negate, dir_only
+
+
+class IgnoreMatcher:
+    """
+    Decides which paths under a root are hidden: directories named in hidden_dirs and,
+    optionally, anything excluded by .gitignore files.
+
+    Every directory's .gitignore is read and compiled once, and the verdict for each
+    path is cached, so checking a child costs one lookup for its parent plus its own
+    rules. Like git, nothing below an ignored directory can be re-included. Call
+    invalidate() after ignore files change.
+    """
+
+    def __init__(self, root: str, hidden_dirs: Iterable[str] = (), use_gitignore: bool = True) -> None:
+        self.root = root.replace(os.sep, '/').rstrip('/') or '/'
+        self.hidden_dirs = set(hidden_dirs)
+        self.use_gitignore = use_gitignore
+        self._lock = threading.Lock()
+        self._rules: Dict[str, List[Tuple[Pattern, bool, bool]]] = {}
+        self._results: Dict[Tuple[str, bool], bool] = {}
+
+    def invalidate(self) -> None:
+        """
+        Forget compiled rules and cached verdicts.
+        """
+        with self._lock:
+            self._rules.clear()
+            self._results.clear()
+
+    def _read_rules(self, directory: str) -> List[Tuple[Pattern, bool, bool]]:
+        rules = self._rules.get(directory)
+        if rules is None:
+            rules = []
+            ignore_files = [os.path.join(directory, '.gitignore')]
+            if directory == self.root:
+                ignore_files.insert(0, os.path.join(directory, '.git', 'info', 'exclude'))
+            for ignore_file in ignore_files:
+                try:
+                    with open(ignore_file, 'r', encoding='utf-8', errors='replace') as f:
+                        for line in f:
+                            rule = compile_gitignore_line(line)
+                            if rule is not None:
+                                rules.append(rule)
+                except OSError:
+                    pass
+            self._rules[directory] = rules
+        return rules
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        """
+        Return True if the path should be hidden from the tree and from bulk selection.
+
+        :param path: Absolute path of the entry.
+        :param is_dir: Whether the entry is a directory.
+        """
+        path = path.replace(os.sep, '/')
+        key = (path, is_dir)
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                result = self._evaluate(path, is_dir)
+                self._results[key] = result
+        return result
+
+    def _evaluate(self, path: str, is_dir: bool) -> bool:
+        parent, _, name = path.rpartition('/')
+        if is_dir and name in self.hidden_dirs:
+            return True
+        if not self.use_gitignore or path == self.root or not path.startswith(self.root.rstrip('/') + '/'):
+            return False
+        parent = parent or '/'
+        if parent != self.root:
+            parent_key = (parent, True)
+            parent_ignored = self._results.get(parent_key)
+            if parent_ignored is None:
+                parent_ignored = self._evaluate(parent, True)
+                self._results[parent_key] = parent_ignored
+            if parent_ignored:
+                return True
+        # Rules from the root's .gitignore down to the parent's; the last match wins
+        ignored = False
+        directory = self.root
+        relative = path[len(self.root.rstrip('/')) + 1:]
+        while True:
+            for regex, negate, dir_only in self._read_rules(directory):
+                if (is_dir or not dir_only) and regex.match(relative):
+                    ignored = not negate
+            head, _, relative = relative.partition('/')
+            if not relative:
+                break
+            directory = directory.rstrip('/') + '/' + head
+        return ignored
+
+
+# ----------------------------
+# Selection
+# ----------------------------
+
+class _TrieNode:
+    __slots__ = ('children', 'is_file', 'checked', 'size', 'scanned',
+                 'selected', 'selected_bytes', 'total', 'total_bytes')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.is_file = False
+        self.checked = False
+        self.size = 0
+        # Set on directories whose eligible files have all been registered by scan()
+        self.scanned = False
+        # Checked and known files at or below this node, and their sizes
+        self.selected = 0
+        self.selected_bytes = 0
+        self.total = 0
+        self.total_bytes = 0
+
+
+class SelectionTrie:
+    """
+    Set of checked file paths stored as a prefix tree of path components.
+
+    Besides the checked files, the trie knows every file registered by scan() (the
+    eligible files of a walked directory). Each node keeps the number and size of the
+    checked and known files below it, updated along the path on every change, so the
+    state of a folder is a lookup that costs O(depth) instead of a rescan:
+
+        trie.scan('/repo/src', iter_matching_file_sizes('/repo/src', ['*.py'], []))
+        trie.set_subtree('/repo/src', True)
+        trie.counts('/repo')  # (selected, total, selected bytes, total bytes, complete)
+
+    Paths use forward slashes. The set interface (in, len, iteration, add, discard,
+    difference_update) matches the flat set it replaces.
+    """
+
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+
+    @staticmethod
+    def _parts(path: str) -> List[str]:
+        return path.rstrip('/').split('/') if path != '/' else ['']
+
+    def _chain(self, path: str, create: bool = False) -> Optional[List[_TrieNode]]:
+        """
+        Return the nodes from the root down to path, or None if path is unknown.
+        """
+        node = self._root
+        chain = [node]
+        for part in self._parts(path):
+            child = node.children.get(part)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[part] = _TrieNode()
+            node = child
+            chain.append(node)
+        return chain
+
+    def __contains__(self, path: str) -> bool:
+        chain = self._chain(path)
+        return chain is not None and chain[-1].checked
+
+    def __len__(self) -> int:
+        return self._root.selected
+
+    def __iter__(self) -> Iterator[str]:
+        for path, node in self._iter_files(self._root, None):
+            if node.checked:
+                yield path
+
+    @property
+    def selected_bytes(self) -> int:
+        return self._root.selected_bytes
+
+    def _iter_files(self, node: _TrieNode, prefix: Optional[str]) -> Iterator[Tuple[str, _TrieNode]]:
+        """
+        Yield the files below node in sorted path order, the order of sorted(paths).
+        """
+        stack = [(prefix, node)]
+        while stack:
+            path, node = stack.pop()
+            if node.is_file:
+                yield path, node
+            # A folder sorts as 'name/' so that e.g. 'a.py' comes before 'a/b.py', as in a string sort
+            children = sorted(node.children.items(), key=lambda item: item[0] + '/' if item[1].children else item[0],
+                              reverse=True)
+            for name, child in children:
+                stack.append((name if path is None else f"{path}/{name}", child))
+
+    def _register(self, path: str, size: int) -> List[_TrieNode]:
+        chain = self._chain(path, create=True)
+        leaf = chain[-1]
+        if not leaf.is_file:
+            leaf.is_file = True
+            leaf.size = size
+            for node in chain:
+                node.total += 1
+                node.total_bytes += size
+        elif leaf.size != size:
+            delta = size - leaf.size
+            leaf.size = size
+            for node in chain:
+                node.total_bytes += delta
+                if leaf.checked:
+                    node.selected_bytes += delta
+        return chain
+
+    def add(self, path: str, size: int = 0) -> bool:
+        """
+        Check a file, registering it if needed.
+
+        :return: True if the file was not checked before.
+        """
+        chain = self._register(path, size)
+        leaf = chain[-1]
+        if leaf.checked:
+            return False
+        leaf.checked = True
+        for node in chain:
+            node.selected += 1
+            node.selected_bytes += leaf.size
+        return True
+
+    def discard(self, path: str) -> bool:
+        """
+        Uncheck a file; it stays registered.
+
+        :return: True if the file was checked before.
+        """
+        chain = self._chain(path)
+        if chain is None or not chain[-1].checked:
+            return False
+        leaf = chain[-1]
+        leaf.checked = False
+        for node in chain:
+            node.selected -= 1
+            node.selected_bytes -= leaf.size
+        return True
+
+    def difference_update(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            self.discard(path)
+
+    def _remove(self, path: str) -> None:
+        chain = self._chain(path)
+        if chain is None or not chain[-1].is_file:
+            return
+        self.discard(path)
+        leaf = chain[-1]
+        for node in chain:
+            node.total -= 1
+            node.total_bytes -= leaf.size
+        leaf.is_file = False
+        # Drop branches left without files
+        parts = self._parts(path)
+        for depth in range(len(parts), 0, -1):
+            node = chain[depth]
+            if node.children or node.is_file or node.scanned:
+                break
+            del chain[depth - 1].children[parts[depth - 1]]
+
+    def scan(self, directory: str, files: Iterable[Tuple[str, int]]) -> None:
+        """
+        Register the eligible files of a directory, as found by a walk.
+
+        Known files that were not found again are forgotten unless checked. The
+        directory is then complete: its totals are exact until the next scan.
+
+        :param directory: The walked directory.
+        :param files: (path, size) of every eligible file below it.
+        """
+        found = dict(files)
+        chain = self._chain(directory)
+        if chain is not None:
+            stale = [path for path, node in self._iter_files(chain[-1], directory.rstrip('/'))
+                     if path not in found and not node.checked]
+            for path in stale:
+                self._remove(path)
+        for path, size in found.items():
+            self._register(path, size)
+        self._chain(directory, create=True)[-1].scanned = True
+
+    def set_subtree(self, directory: str, checked: bool) -> List[str]:
+        """
+        Check or uncheck every known file below a directory.
+
+        :return: The paths whose state changed.
+        """
+        chain = self._chain(directory)
+        if chain is None:
+            return []
+        changed = []
+        for path, node in list(self._iter_files(chain[-1], directory.rstrip('/'))):
+            if node.checked != checked and (self.add(path, node.size) if checked else self.discard(path)):
+                changed.append(path)
+        return changed
+
+    def is_complete(self, path: str) -> bool:
+        """
+        Return True if path lies in a scanned directory, so its totals are exact.
+        """
+        node = self._root
+        for part in self._parts(path):
+            node = node.children.get(part)
+            if node is None:
+                return False
+            if node.scanned:
+                return True
+        return False
+
+    def counts(self, path: str) -> Tuple[int, int, int, int, bool]:
+        """
+        Return (selected files, known files, selected bytes, known bytes, complete) at or below path.
+        """
+        chain = self._chain(path)
+        complete = self.is_complete(path)
+        if chain is None:
+            return 0, 0, 0, 0, complete
+        node = chain[-1]
+        return node.selected, node.total, node.selected_bytes, node.total_bytes, complete
+
+    def retain(self, keep: Callable[[str], bool]) -> None:
+        """
+        Keep only the checked files accepted by keep, forgetting known files and scans.
+        """
+        checked = [(path, node.size) for path, node in self._iter_files(self._root, None)
+                   if node.checked and keep(path)]
+        self.clear()
+        for path, size in checked:
+            self.add(path, size)
+
+    def clear(self) -> None:
+        self._root = _TrieNode()
+
+
+# ----------------------------
+# Instrumentation
+# ----------------------------
+
+class PipelineStats:
+    """
+    Per-stage timers and counters for one rebuild.
+
+    Stages are timed with timer() and summed, so a stage run by several reader
+    threads reports their combined time rather than wall time. Safe to update from
+    any thread.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return {'timings_ms': {stage: ms}, 'counters': {name: value}}.
+        """
+        with self._lock:
+            return {'timings_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.timings.items()},
+                    'counters': dict(self.counters)}
+
+    def format(self) -> str:
+        """
+        One-line summary, e.g. "read 12 files (48.0 KB), 288 cached | read 3.1 ms | convert 40.2 ms".
+        """
+        snapshot = self.snapshot()
+        counters = snapshot['counters']
+        parts = [f"read {counters.get('files_read', 0)} files ({counters.get('bytes_read', 0) / 1024:.1f} KB), "
+                 f"{counters.get('cache_hits', 0)} cached"]
+        if counters.get('duplicates'):
+            parts[0] += f", {counters['duplicates']} duplicates"
+        parts.extend(f"{stage} {ms:.1f} ms" for stage, ms in snapshot['timings_ms'].items())
+        return ' | '.join(parts)
+
+
+# ----------------------------
+# Persistent Index
+# ----------------------------
+
+class PersistentIndex:
+    """
+    SQLite file that outlives the process: the selection of every root directory and,
+    for each file read, its mtime, size, content hash and rendered chunks.
+
+    FileContentCache and RenderCache fall back to it on a miss, so after a restart
+    unchanged files are neither re-read nor re-converted. Writes are batched and
+    committed every COMMIT_EVERY rows or when commit() is called. prune() keeps the
+    stored chunks under max_bytes by dropping the least recently written files.
+    """
+
+    COMMIT_EVERY = 256
+
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, base TEXT,
+                    hash TEXT, markdown TEXT, plain TEXT);
+                CREATE TABLE IF NOT EXISTS html (hash TEXT PRIMARY KEY, html TEXT);
+                CREATE TABLE IF NOT EXISTS selections (
+                    root TEXT, path TEXT, serial INTEGER, PRIMARY KEY (root, path));
+            ''')
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(files)')}
+            if 'content_hash' not in columns:
+                self._conn.execute('ALTER TABLE files ADD COLUMN content_hash TEXT')
+            if 'written' not in columns:
+                self._conn.execute('ALTER TABLE files ADD COLUMN written REAL DEFAULT 0')
+            self._conn.commit()
+
+    def _write(self, sql: str, params: Tuple) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def commit(self) -> None:
+        """
+        Flush batched writes to disk.
+        """
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        with self._lock:
+            self._conn.close()
+
+    def get_chunks(self, file_path: str, mtime: int, size: int,
+                   base: Optional[str] = None) -> Optional[Tuple[str, str, str]]:
+        """
+        Return the stored (markdown, plain text, content hash) of a file if its mtime
+        and size still match. Chunk headers hold paths relative to the working
+        directory or workspace, so the entry must also have been written under the
+        same base (see _display_base; by default the current one).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT markdown, plain, content_hash FROM files '
+                'WHERE path = ? AND mtime_ns = ? AND size = ? AND base = ? AND content_hash IS NOT NULL',
+                (file_path, mtime, size, base if base is not None else _display_base())).fetchone()
+        return (row[0], row[1], row[2]) if row is not None else None
+
+    def put_chunks(self, file_path: str, mtime: int, size: int, markdown_chunk: str, plain_chunk: str,
+                   content_hash: str = '', base: Optional[str] = None) -> None:
+        if base is None:
+            base = _display_base()
+        self._write('INSERT OR REPLACE INTO files '
+                    '(path, mtime_ns, size, base, hash, markdown, plain, content_hash, written) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (file_path, mtime, size, base, RenderCache.content_key(markdown_chunk),
+                     markdown_chunk, plain_chunk, content_hash, time.time()))
+
+    def clear_chunks(self) -> None:
+        """
+        Drop every stored chunk, e.g. after the excerpt size limit changed.
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM files')
+            self._conn.commit()
+            self._pending = 0
+
+    def get_html(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT html FROM html WHERE hash = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def put_html(self, key: str, html: str) -> None:
+        self._write('INSERT OR REPLACE INTO html VALUES (?, ?)', (key, html))
+
+    def load_selection(self, root: str) -> List[str]:
+        """
+        Return the files saved as checked under a root directory, in selection order.
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT path FROM selections WHERE root = ? ORDER BY serial',
+                                      (root,)).fetchall()
+        return [row[0] for row in rows]
+
+    def save_selection(self, root: str, file_paths: Iterable[str]) -> None:
+        """
+        Replace the saved selection of a root directory.
+
+        :param root: The root directory the selection was made under.
+        :param file_paths: Checked files, in selection order.
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM selections WHERE root = ?', (root,))
+            self._conn.executemany('INSERT INTO selections VALUES (?, ?, ?)',
+                                   ((root, path, serial) for serial, path in enumerate(file_paths)))
+            self._conn.commit()
+            self._pending = 0
+
+    def prune(self) -> None:
+        """
+        Remove chunks of files that no longer exist, the least recently written chunks
+        beyond max_bytes, and HTML no stored chunk refers to (e.g. of older versions).
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT path, length(markdown) + length(plain) FROM files '
+                                      'ORDER BY written DESC').fetchall()
+        stale = []
+        total = 0
+        for path, cost in rows:
+            total += cost or 0
+            if total > self.max_bytes or not os.path.exists(path):
+                stale.append((path,))
+        with self._lock:
+            self._conn.executemany('DELETE FROM files WHERE path = ?', stale)
+            self._conn.execute('DELETE FROM html WHERE hash NOT IN (SELECT hash FROM files)')
+            self._conn.commit()
+            self._pending = 0
+
+
+# ----------------------------
+# Caches
+# ----------------------------
+
+class LRUByteCache:
+    """
+    Thread-safe LRU mapping whose entries are evicted to stay under a byte budget.
+
+    Shared by the render worker and the GUI thread, so every access takes a lock.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _get(self, key: str, is_valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (is_valid is not None and not is_valid(entry[1])):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key: str, value: Any, cost: int) -> None:
+        with self._lock:
+            self._evict(key)
+            if cost > self.max_bytes:
+                return
+            self._entries[key] = (cost, value)
+            self._total_bytes += cost
+            while self._total_bytes > self.max_bytes:
+                _, (old_cost, _) = self._entries.popitem(last=False)
+                self._total_bytes -= old_cost
+
+    def evict(self, key: str) -> None:
+        """
+        Drop the entry stored under key, if any.
+        """
+        with self._lock:
+            self._evict(key)
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+class FileContentCache(LRUByteCache):
+    """
+    LRU cache of the rendered markdown and plain text chunks of individual files.
+
+    Entries are keyed by path and validated against the file's mtime and size and the
+    base its chunk headers were named under (see _display_base), so a rebuild only
+    re-reads files that changed on disk or were not seen before. The
+    total size of the cached chunks is kept under a byte budget. An optional
+    PersistentIndex backs the cache across restarts.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, index: Optional[PersistentIndex] = None) -> None:
+        super().__init__(max_bytes)
+        self.index = index
+
+    def get(self, file_path: str, mtime: int, size: int,
+            base: Optional[str] = None) -> Optional[Tuple[str, str, str]]:
+        """
+        Return the cached (markdown, plain text, content hash) of a file if still valid.
+
+        :param file_path: Absolute path of the file.
+        :param mtime: Current modification time of the file in nanoseconds.
+        :param size: Current size of the file in bytes.
+        :param base: Base the chunk headers must be named under; defaults to the current one.
+        :return: The cached chunks and hash, or None on a miss or a stale entry.
+        """
+        if base is None:
+            base = _display_base()
+        entry = self._get(file_path, lambda value: value[0] == mtime and value[1] == size and value[5] == base)
+        if entry is None:
+            if self.index is not None:
+                chunks = self.index.get_chunks(file_path, mtime, size, base)
+                if chunks is not None:
+                    self._put(file_path, (mtime, size) + chunks + (base,), len(chunks[0]) + len(chunks[1]))
+                return chunks
+            return None
+        return entry[2], entry[3], entry[4]
+
+    def put(self, file_path: str, mtime: int, size: int, markdown_chunk: str, plain_chunk: str,
+            content_hash: str = '', base: Optional[str] = None) -> None:
+        """
+        Store the chunks and content hash of a file, evicting least recently used entries if needed.
+
+        :param base: Base the chunk headers were named under; defaults to the current one.
+        """
+        if base is None:
+            base = _display_base()
+        cost = len(markdown_chunk) + len(plain_chunk)
+        self._put(file_path, (mtime, size, markdown_chunk, plain_chunk, content_hash, base), cost)
+        # Chunks too big for the memory budget are not worth persisting either
+        if self.index is not None and cost <= self.max_bytes:
+            self.index.put_chunks(file_path, mtime, size, markdown_chunk, plain_chunk, content_hash, base)
+
+
+class RenderCache(LRUByteCache):
+    """
+    LRU cache of per-file HTML keyed by a hash of the file's markdown chunk.
+
+    Because the key is the content itself, unchanged files are never converted twice,
+    whatever else changed in the selection. An optional PersistentIndex backs the
+    cache across restarts.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, index: Optional[PersistentIndex] = None) -> None:
+        super().__init__(max_bytes)
+        self.index = index
+
+    @staticmethod
+    def content_key(markdown_chunk: str) -> str:
+        return hashlib.sha1(markdown_chunk.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def get(self, markdown_chunk: str) -> Optional[str]:
+        """
+        Return the cached HTML of a markdown chunk, or None on a miss.
+        """
+        key = self.content_key(markdown_chunk)
+        html = self._get(key)
+        if html is None and self.index is not None:
+            html = self.index.get_html(key)
+            if html is not None:
+                self._put(key, html, len(html))
+        return html
+
+    def put(self, markdown_chunk: str, html: str) -> None:
+        """
+        Store the HTML rendered from a markdown chunk.
+        """
+        key = self.content_key(markdown_chunk)
+        self._put(key, html, len(html))
+        if self.index is not None and len(html) <= self.max_bytes:
+            self.index.put_html(key, html)
+
+
+def new_markdown_converter() -> Any:
+    """
+    Create the markdown.Markdown instance used to render file chunks.
+
+    markdown is imported here rather than at module load so that plain text and
+    headless use never pay for it.
+    """
+    import markdown
+    return markdown.Markdown(extensions=['fenced_code'])
+
+
+def render_markdown_chunk(markdown_chunk: str, cache: Optional[RenderCache] = None,
+                          converter: Optional[Any] = None) -> str:
+    """
+    Convert a single file's markdown chunk to HTML, reusing a cached result if possible.
+
+    :param markdown_chunk: The markdown chunk of one file.
+    :param cache: Optional cache of previously rendered chunks.
+    :param converter: Optional Markdown instance (see new_markdown_converter) to reuse across calls.
+    :return: The rendered HTML.
+    """
+    if cache is not None:
+        html = cache.get(markdown_chunk)
+        if html is not None:
+            return html
+    if converter is None:
+        converter = new_markdown_converter()
+    html = converter.reset().convert(markdown_chunk)
+    if cache is not None:
+        cache.put(markdown_chunk, html)
+    return html
+
+
+def iter_matching_files(root: str, patterns: Any, hidden_dirs: Iterable[str],
+                        ignore: Optional[IgnoreMatcher] = None) -> Iterator[str]:
+    """
+    Walk a directory with os.scandir and yield the files the tree would list.
+
+    Applies the same rules as CheckableFileSystemModel and DirectoryFilterProxyModel:
+    hidden entries are skipped, directories named in hidden_dirs are pruned and files
+    must match one of the name filter patterns (case-insensitively). Paths use forward
+    slashes, like QFileSystemModel.filePath().
+
+    :param root: Directory to walk.
+    :param patterns: Name filter patterns (e.g., ['*.py', '*.js']) or a prebuilt NameMatcher.
+    :param hidden_dirs: Directory names that are never entered.
+    :param ignore: Optional IgnoreMatcher; ignored directories are pruned without listing them.
+    :return: An iterator over matching file paths.
+    """
+    for path, _ in _walk_matching(root, patterns, hidden_dirs, ignore):
+        yield path
+
+
+def iter_matching_file_sizes(root: str, patterns: Any, hidden_dirs: Iterable[str],
+                             ignore: Optional[IgnoreMatcher] = None) -> Iterator[Tuple[str, int]]:
+    """
+    Like iter_matching_files, but yield (path, size in bytes) pairs.
+    """
+    for path, entry in _walk_matching(root, patterns, hidden_dirs, ignore):
+        try:
+            yield path, entry.stat().st_size
+        except OSError:
+            yield path, 0
+
+
+def _walk_matching(root: str, patterns: Any, hidden_dirs: Iterable[str],
+                   ignore: Optional[IgnoreMatcher]) -> Iterator[Tuple[str, "os.DirEntry"]]:
+    matcher = patterns if isinstance(patterns, NameMatcher) else NameMatcher(patterns)
+    hidden_dirs = set(hidden_dirs)
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    path = entry.path.replace(os.sep, '/')
+                    if ignore is not None and ignore.is_ignored(path, is_dir):
+                        continue
+                    if is_dir:
+                        if entry.name not in hidden_dirs:
+                            pending.append(path)
+                    elif matcher.matches(entry.name):
+                        yield path, entry
+        except OSError as e:
+            logging.error(f"Error listing directory {directory}: {e}")
+
+
+def read_file_text(file_path: str, max_bytes: int = DEFAULT_MAX_FILE_BYTES) -> Optional[str]:
+    """
+    Read a text file, capping how much of it is loaded.
+
+    The first BINARY_SNIFF_BYTES are checked for NUL bytes; binary files return None.
+    Files larger than max_bytes are memory-mapped and only at most their first and last
+    max_bytes / 2 bytes (cut at line boundaries) are decoded, joined by a truncation marker.
+
+    :param file_path: Path of the file to read.
+    :param max_bytes: Maximum number of bytes to include; 0 disables the cap.
+    :return: The (possibly truncated) text with newlines normalized, or None for binary files.
+    :raises OSError, UnicodeDecodeError: If the file cannot be read as UTF-8 text.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(BINARY_SNIFF_BYTES)
+        if b'\0' in head:
+            return None
+        size = os.fstat(f.fileno()).st_size
+        if not max_bytes or size <= max_bytes:
+            text = (head + f.read()).decode('utf-8')
+        else:
+            half = max_bytes // 2
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                head_bytes = mapped[:half]
+                tail_bytes = mapped[size - half:]
+            # Cut on line boundaries where possible, and drop any split multi-byte character
+            if b'\n' in head_bytes:
+                head_bytes = head_bytes[:head_bytes.rfind(b'\n') + 1]
+            if b'\n' in tail_bytes:
+                tail_bytes = tail_bytes[tail_bytes.find(b'\n') + 1:]
+            omitted = size - len(head_bytes) - len(tail_bytes)
+            text = (f"{head_bytes.decode('utf-8', errors='ignore')}"
+                    f"\n... [truncated {omitted} of {size} bytes] ...\n\n"
+                    f"{tail_bytes.decode('utf-8', errors='ignore')}")
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _render_file_chunks(file_path: str, cache: Optional[FileContentCache] = None,
+                        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                        stats: Optional[PipelineStats] = None) -> Optional[Tuple[str, str, str]]:
+    """
+    Build the markdown and plain text chunks of a single file.
+
+    The file's text is hashed as it is read, for deduplication. Binary and excerpted
+    files get an empty hash and are never treated as duplicates.
+
+    :param file_path: Path of the file to render.
+    :param cache: Optional cache consulted before reading the file from disk.
+    :param max_file_bytes: Size above which only a head/tail excerpt of the file is used.
+    :param stats: Optional PipelineStats updated with read times, byte counts and cache hits.
+    :return: A (markdown, plain text, content hash) tuple, or None if the file could not be read.
+    """
+    # One workspace for the whole read, even if set_workspace() is called meanwhile
+    workspace = _workspace
+    base = _display_base(workspace)
+    try:
+        stat = os.stat(file_path)
+    except OSError as e:
+        logging.error(f"Error reading file {file_path}: {e}")
+        return None
+    if cache is not None:
+        chunks = cache.get(file_path, stat.st_mtime_ns, stat.st_size, base)
+        if chunks is not None:
+            if stats is not None:
+                stats.count('cache_hits')
+            return chunks
+
+    rel_path = _display_path_in(workspace, file_path)
+    file_ext = os.path.splitext(file_path)[1]
+    language = get_language_from_extension(file_ext)
+    start = time.perf_counter()
+    try:
+        file_content = read_file_text(file_path, max_file_bytes)
+    except Exception as e:
+        logging.error(f"Error reading file {file_path}: {e}")
+        return None
+    if stats is not None:
+        stats.add_time('read', time.perf_counter() - start)
+        stats.count('files_read')
+        stats.count('bytes_read', min(stat.st_size, max_file_bytes) if max_file_bytes > 0 else stat.st_size)
+    if file_content is None:
+        language = ''
+        file_content = f"[binary file omitted: {stat.st_size} bytes]"
+        content_hash = ''
+    elif 0 < max_file_bytes < stat.st_size:
+        content_hash = ''
+    else:
+        content_hash = hashlib.sha1(file_content.encode('utf-8', 'surrogatepass')).hexdigest()
+    file_content = file_content or "TODO"
+    markdown_chunk = f"## `{rel_path}`\n```{language}\n{file_content}\n```\n\n"
+    plain_chunk = f"{rel_path}\n{file_content}\n\n"
+    if cache is not None:
+        cache.put(file_path, stat.st_mtime_ns, stat.st_size, markdown_chunk, plain_chunk, content_hash, base)
+    return markdown_chunk, plain_chunk, content_hash
+
+
+def _duplicate_chunks(file_path: str, original_path: str, content_hash: str) -> Tuple[str, str, str]:
+    """
+    Build the back-reference chunks that stand in for a duplicate file.
+    """
+    rel_path = display_path(file_path)
+    original = display_path(original_path)
+    return (f"## `{rel_path}`\n_Identical to `{original}`._\n\n",
+            f"{rel_path}\n[identical to {original}]\n\n",
+            content_hash)
+
+
+def _iter_rendered(file_paths: Iterable[str], cache: Optional[FileContentCache] = None, workers: int = 1,
+                   max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, stats: Optional[PipelineStats] = None,
+                   dedup: bool = False) -> Iterator[Tuple[str, Optional[Tuple[str, str, str]]]]:
+    """
+    Yield (file path, chunks) for every input file, in input order.
+
+    chunks is None for files that are skipped or could not be read. With dedup, a file
+    whose content is identical to an earlier one is replaced by a short reference to
+    the first copy.
+    """
+    rendered = _iter_read(file_paths, cache, workers, max_file_bytes, stats)
+    if not dedup:
+        yield from rendered
+        return
+    first_by_hash: Dict[str, str] = {}
+    for file_path, chunks in rendered:
+        if chunks is not None and chunks[2]:
+            original_path = first_by_hash.setdefault(chunks[2], file_path)
+            if original_path != file_path:
+                chunks = _duplicate_chunks(file_path, original_path, chunks[2])
+                if stats is not None:
+                    stats.count('duplicates')
+        yield file_path, chunks
+
+
+def _iter_read(file_paths: Iterable[str], cache: Optional[FileContentCache] = None, workers: int = 1,
+               max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+               stats: Optional[PipelineStats] = None) -> Iterator[Tuple[str, Optional[Tuple[str, str, str]]]]:
+    """
+    Read and render every input file, yielding (file path, chunks) in input order.
+
+    With more than one worker, files are read by a bounded thread pool that stays a
+    few files ahead of the consumer, which hides per-file latency on network filesystems.
+    """
+    if workers <= 1:
+        for file_path in file_paths:
+            yield file_path, _render_file_chunks(file_path, cache, max_file_bytes, stats)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file-reader')
+    try:
+        in_flight: deque = deque()
+        for file_path in file_paths:
+            future = executor.submit(_render_file_chunks, file_path, cache, max_file_bytes, stats)
+            in_flight.append((file_path, future))
+            if len(in_flight) >= workers * 4:
+                pending_path, future = in_flight.popleft()
+                yield pending_path, future.result()
+        while in_flight:
+            pending_path, future = in_flight.popleft()
+            yield pending_path, future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_file_chunks(file_paths: Iterable[str], cache: Optional[FileContentCache] = None, workers: int = 1,
+                     max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                     stats: Optional[PipelineStats] = None, dedup: bool = False) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield the (file path, markdown, plain text) chunks of each readable file, in order.
+
+    With dedup, files identical to an earlier one yield a back-reference to it instead.
+    """
+    for file_path, chunks in _iter_rendered(file_paths, cache, workers, max_file_bytes, stats, dedup):
+        if chunks is None:
+            continue  # Skip this file
+        yield file_path, chunks[0], chunks[1]
+
+
+def iter_concatenated(file_paths: Iterable[str], fmt: str = 'markdown',
+                      cache: Optional[FileContentCache] = None, workers: int = 1,
+                      max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, dedup: bool = False) -> Iterator[str]:
+    """
+    Lazily yield the concatenated content of the given files, one fragment per file.
+
+    :param file_paths: File paths to concatenate.
+    :param fmt: Output format, either 'markdown' or 'plain'.
+    :param cache: Optional per-file cache; only files missing from it are read from disk.
+    :param workers: Number of threads reading files ahead of the consumer.
+    :param max_file_bytes: Size above which only a head/tail excerpt of a file is used.
+    :param dedup: Replace files identical to an earlier one with a back-reference.
+    :return: An iterator over the per-file fragments of the requested format.
+    """
+    if fmt not in ('markdown', 'plain'):
+        raise ValueError(f"Unknown format: {fmt}")
+    position = 1 if fmt == 'markdown' else 2
+    for chunks in iter_file_chunks(file_paths, cache, workers, max_file_bytes, dedup=dedup):
+        yield chunks[position]
+
+
+def write_concatenated(file_paths: List[str], out: TextIO, fmt: str = 'markdown',
+                       cache: Optional[FileContentCache] = None,
+                       progress: Optional[Callable[[int, int], bool]] = None, workers: int = 1,
+                       max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, dedup: bool = False,
+                       snapshot: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Stream the concatenated content of the given files to an open text stream.
+
+    Only one file is held in memory at a time.
+
+    :param file_paths: List of file paths to concatenate.
+    :param out: Writable text stream receiving the fragments.
+    :param fmt: Output format, either 'markdown' or 'plain'.
+    :param cache: Optional per-file cache; only files missing from it are read from disk.
+    :param progress: Optional callback receiving (files done, total files); returning
+                     False cancels the write.
+    :param workers: Number of threads reading files ahead of the writer.
+    :param max_file_bytes: Size above which only a head/tail excerpt of a file is used.
+    :param dedup: Replace files identical to an earlier one with a back-reference.
+    :param snapshot: Optional dict filled with the export snapshot of the written files
+                     (see delta_since_snapshot), from the hashes computed while writing.
+    :return: True if every file was processed, False if the write was cancelled.
+    """
+    if fmt not in ('markdown', 'plain'):
+        raise ValueError(f"Unknown format: {fmt}")
+    position = 0 if fmt == 'markdown' else 1
+    total = len(file_paths)
+    files: Dict[str, Dict[str, Any]] = {}
+    stats_before_read: Dict[str, os.stat_result] = {}
+
+    def stat_ahead() -> Iterator[str]:
+        # Stat each file just before it is read, so the snapshot never pairs a newer mtime with older content
+        for file_path in file_paths:
+            with contextlib.suppress(OSError):
+                stats_before_read[file_path] = os.stat(file_path)
+            yield file_path
+
+    rendered = _iter_rendered(file_paths if snapshot is None else stat_ahead(), cache, workers, max_file_bytes,
+                              dedup=dedup)
+    for done, (file_path, chunks) in enumerate(rendered, 1):
+        stat = stats_before_read.pop(file_path, None)
+        if chunks is not None:
+            out.write(chunks[position])
+            if stat is not None:
+                files[file_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': chunks[2]}
+        if progress is not None and not progress(done, total):
+            return False
+    if snapshot is not None:
+        snapshot.update(_new_snapshot(files))
+    return True
+
+
+def concatenate_files(file_paths: List[str], cache: Optional[FileContentCache] = None,
+                      workers: int = 1, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                      dedup: bool = False) -> Tuple[str, str]:
+    """
+    Concatenate the contents of the given files into markdown and plain text formats.
+
+    :param file_paths: List of file paths to concatenate.
+    :param cache: Optional per-file cache; only files missing from it are read from disk.
+    :param workers: Number of threads used to read files; output order is preserved.
+    :param max_file_bytes: Size above which only a head/tail excerpt of a file is used.
+    :param dedup: Replace files identical to an earlier one with a back-reference.
+    :return: A tuple containing markdown content and plain text content.
+    """
+    chunks = list(iter_file_chunks(file_paths, cache, workers, max_file_bytes, dedup=dedup))
+    markdown_content = ''.join(markdown_chunk for _, markdown_chunk, _ in chunks)
+    plain_text_content = ''.join(plain_chunk for _, _, plain_chunk in chunks)
+    return markdown_content, plain_text_content
+
+
+# ----------------------------
+# Workspaces
+# ----------------------------
+
+def _scan_root(root: str, patterns: List[str], hidden_dirs: List[str],
+               use_gitignore: bool) -> List[Tuple[str, int]]:
+    ignore = IgnoreMatcher(root, hidden_dirs, use_gitignore)
+    return sorted(iter_matching_file_sizes(root, patterns, hidden_dirs, ignore))
+
+
+class Workspace:
+    """
+    One or more root directories opened together as a single tree and concatenation.
+
+    Each file is named relative to its root; with several roots the name starts with
+    the root's label, the folder name of the root extended with parent folders where
+    two roots share a name (e.g. 'backend/app.py', 'client/lib/util.js'). Roots nested
+    in another root are dropped. Paths use forward slashes.
+    """
+
+    def __init__(self, roots: Iterable[str]) -> None:
+        normalized = []
+        for root in roots:
+            root = os.path.abspath(root).replace(os.sep, '/')
+            if root not in normalized:
+                normalized.append(root)
+        self.roots = [root for root in normalized
+                      if not any(other != root and self._within(root, other) for other in normalized)]
+        if not self.roots:
+            raise ValueError("A workspace needs at least one root directory")
+        self.labels = self._make_labels(self.roots)
+
+    @staticmethod
+    def _within(path: str, root: str) -> bool:
+        return path == root or path.startswith(root.rstrip('/') + '/')
+
+    @staticmethod
+    def _make_labels(roots: List[str]) -> Dict[str, str]:
+        parts = {root: [part for part in root.split('/') if part] or [root] for root in roots}
+        depth = dict.fromkeys(roots, 1)
+        while True:
+            labels = {root: '/'.join(parts[root][-depth[root]:]) for root in roots}
+            seen: Dict[str, List[str]] = {}
+            for root, label in labels.items():
+                seen.setdefault(label, []).append(root)
+            clashing = [root for group in seen.values() if len(group) > 1 for root in group
+                        if depth[root] < len(parts[root])]
+            if not clashing:
+                return labels
+            for root in clashing:
+                depth[root] += 1
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the set of roots, e.g. to store its selection; a lone root is its own key.
+        """
+        return '\n'.join(self.roots)
+
+    @property
+    def common_root(self) -> str:
+        """
+        The deepest directory containing every root.
+        """
+        if len(self.roots) == 1:
+            return self.roots[0]
+        return os.path.commonpath(self.roots).replace(os.sep, '/')
+
+    def root_of(self, path: str) -> Optional[str]:
+        """
+        Return the root containing a path, or None if it lies outside the workspace.
+        """
+        path = path.replace(os.sep, '/')
+        for root in self.roots:
+            if self._within(path, root):
+                return root
+        return None
+
+    def is_ancestor(self, path: str) -> bool:
+        """
+        Return True if a directory is above one of the roots without being inside any.
+        """
+        path = path.replace(os.sep, '/')
+        return any(root != path and self._within(root, path) for root in self.roots)
+
+    def roots_below(self, directory: str) -> List[str]:
+        """
+        Return the parts of the workspace below a directory: itself if it is inside a
+        root, otherwise the roots it contains.
+        """
+        directory = directory.replace(os.sep, '/')
+        if self.root_of(directory) is not None:
+            return [directory]
+        return [root for root in self.roots if self._within(root, directory)]
+
+    def display_path(self, path: str) -> str:
+        root = self.root_of(path)
+        if root is None:
+            return os.path.relpath(path)
+        relative = path.replace(os.sep, '/')[len(root.rstrip('/')) + 1:]
+        if len(self.roots) > 1:
+            relative = f"{self.labels[root]}/{relative}" if relative else self.labels[root]
+        return os.path.normpath(relative) if relative else os.curdir
+
+    def scan(self, patterns: List[str], hidden_dirs: Iterable[str], use_gitignore: bool = True,
+             directories: Optional[List[str]] = None, workers: Optional[int] = None,
+             processes: bool = False) -> List[Tuple[str, int]]:
+        """
+        Walk the roots in parallel, each with its own IgnoreMatcher.
+
+        Threads overlap the directory listing system calls, which is what dominates on
+        cold caches and network drives. Processes also spread the name and .gitignore
+        matching over several cores, at the cost of starting them and pickling results.
+
+        :param patterns: Name filter patterns (e.g., ['*.py', '*.js']).
+        :param hidden_dirs: Directory names that are never entered.
+        :param use_gitignore: Apply each root's .gitignore files.
+        :param directories: Directories to walk instead of the roots, e.g. from roots_below().
+        :param workers: Maximum number of threads or processes; defaults to one per directory.
+        :param processes: Use a process pool instead of a thread pool.
+        :return: (path, size) of every matching file, sorted within each directory, in root order.
+        """
+        directories = self.roots if directories is None else directories
+        if len(directories) == 1:
+            return _scan_root(directories[0], list(patterns), list(hidden_dirs), use_gitignore)
+        count = len(directories)
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool(max_workers=min(workers or count, count)) as executor:
+            results = executor.map(_scan_root, directories, [list(patterns)] * count, [list(hidden_dirs)] * count,
+                                   [use_gitignore] * count)
+            return [entry for result in results for entry in result]
+
+
+class WorkspaceIgnoreMatcher:
+    """
+    Applies the IgnoreMatcher of the root each path belongs to.
+
+    Paths outside every root (the folders leading to them) are never ignored.
+    """
+
+    def __init__(self, workspace: Workspace, hidden_dirs: Iterable[str] = (), use_gitignore: bool = True) -> None:
+        self.workspace = workspace
+        self._matchers = {root: IgnoreMatcher(root, hidden_dirs, use_gitignore) for root in workspace.roots}
+
+    def invalidate(self) -> None:
+        for matcher in self._matchers.values():
+            matcher.invalidate()
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        root = self.workspace.root_of(path)
+        return root is not None and self._matchers[root].is_ignored(path, is_dir)
+
+
+# The workspace file names are made relative to; None means the working directory
+_workspace: Optional[Workspace] = None
+
+
+def set_workspace(workspace: Optional[Workspace]) -> None:
+    """
+    Name files relative to the roots of a workspace in every chunk rendered from now on.
+
+    Cached chunks are keyed by the workspace they were named under, so entries from
+    another workspace are never returned; clearing the FileContentCache frees them.
+    A file read that started before this call keeps naming its file under the old roots.
+    """
+    global _workspace
+    _workspace = workspace
+
+
+def display_path(file_path: str) -> str:
+    """
+    Return the name of a file in chunk headers: root-qualified within a workspace,
+    otherwise relative to the working directory.
+    """
+    return _display_path_in(_workspace, file_path)
+
+
+def _display_path_in(workspace: Optional[Workspace], file_path: str) -> str:
+    if workspace is not None:
+        return workspace.display_path(file_path)
+    return os.path.relpath(file_path)
+
+
+def _display_base(workspace: Optional[Workspace] = None) -> str:
+    """
+    Return the cache key of the names given by a workspace, by default the current one.
+    """
+    workspace = workspace if workspace is not None else _workspace
+    return workspace.key if workspace is not None else os.getcwd()
+
+
+# ----------------------------
+# Search
+# ----------------------------
+
+def _trigrams(text: str) -> Set[Tuple[str, str, str]]:
+    """
+    Return the lowercase character trigrams of a text.
+
+    Lines are deduplicated and stripped first (source files repeat blank lines,
+    indentation and closing brackets a lot), which drops only trigrams made of
+    leading or trailing whitespace; queries are stripped the same way.
+    """
+    lowered = '\n'.join({line.strip() for line in text.lower().split('\n')})
+    return set(zip(lowered, lowered[1:], lowered[2:]))
+
+
+class TrigramIndex:
+    """
+    Trigram index over file contents, for case-insensitive substring search.
+
+    Each file is stored with the set of its lowercase trigrams. A query only scans
+    the files whose trigram set contains all of the query's trigrams (a C-level set
+    inclusion test per file), so searches take milliseconds even over thousands of
+    files. Files are added, replaced and removed one at a time; sync() reindexes only
+    files whose text changed. Safe to update from the render thread while the GUI
+    thread searches.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._texts: Dict[str, str] = {}
+        self._trigrams: Dict[str, Set[Tuple[str, str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def update(self, file_path: str, text: str) -> None:
+        """
+        Index the text of a file, replacing any earlier version.
+        """
+        with self._lock:
+            if self._texts.get(file_path) == text:
+                return
+        trigrams = _trigrams(text)
+        with self._lock:
+            self._texts[file_path] = text
+            self._trigrams[file_path] = trigrams
+
+    def remove(self, file_path: str) -> None:
+        with self._lock:
+            self._texts.pop(file_path, None)
+            self._trigrams.pop(file_path, None)
+
+    def sync(self, entries: Iterable[Tuple[str, str]]) -> int:
+        """
+        Make the index hold exactly the given files.
+
+        :param entries: (file path, text) of every file to index.
+        :return: The number of files that were (re)indexed.
+        """
+        wanted = set()
+        updated = 0
+        for file_path, text in entries:
+            wanted.add(file_path)
+            # Unchanged files are usually the very same string object, so this is cheap
+            indexed = self._texts.get(file_path)
+            if indexed is not text and indexed != text:
+                self.update(file_path, text)
+                updated += 1
+        with self._lock:
+            for file_path in [path for path in self._texts if path not in wanted]:
+                del self._texts[file_path]
+                del self._trigrams[file_path]
+        return updated
+
+    def search(self, query: str, limit: int = 200) -> List[Tuple[str, int, str]]:
+        """
+        Find the lines containing query, ignoring case.
+
+        :param query: Literal text to look for.
+        :param limit: Maximum number of hits returned.
+        :return: (file path, 1-based line number, line text) per hit, files in sorted order.
+        """
+        if not query:
+            return []
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        with self._lock:
+            if len(query.strip()) >= 3:
+                query_trigrams = _trigrams(query)
+                file_paths = sorted(path for path, trigrams in self._trigrams.items()
+                                    if query_trigrams <= trigrams)
+            else:
+                file_paths = sorted(self._texts)
+            texts = [(path, self._texts[path]) for path in file_paths]
+        hits = []
+        for file_path, text in texts:
+            line_number = 1
+            counted = 0
+            position = 0
+            while True:
+                match = pattern.search(text, position)
+                if match is None:
+                    break
+                line_number += text.count('\n', counted, match.start())
+                counted = match.start()
+                line_start = text.rfind('\n', 0, match.start()) + 1
+                line_end = text.find('\n', match.start())
+                if line_end == -1:
+                    line_end = len(text)
+                hits.append((file_path, line_number, text[line_start:line_end].strip()[:200]))
+                if len(hits) >= limit:
+                    return hits
+                # One hit per line
+                position = line_end + 1
+        return hits
+
+
+# ----------------------------
+# Budgets
+# ----------------------------
+
+BUDGET_UNITS = ['tokens', 'bytes']
+BUDGET_ORDERS = ['selection', 'size', 'recency']
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in a text.
+
+    Uses the common rule of thumb of about four characters per token, which is O(1)
+    on a Python string and close enough for packing prompts.
+    """
+    return (len(text) + 3) // 4
+
+
+def measure(text: str, unit: str = 'tokens') -> int:
+    """
+    Measure a text in budget units.
+
+    :param text: The text to measure.
+    :param unit: 'tokens' (estimated) or 'bytes' (UTF-8).
+    :return: The size of the text in the given unit.
+    """
+    if unit == 'tokens':
+        return estimate_tokens(text)
+    return len(text.encode('utf-8', 'surrogatepass'))
+
+
+class Budget:
+    """
+    Packs file chunks into a fixed number of tokens or bytes.
+
+    Files are taken in priority order (see order_files) while they fit; the first file
+    that does not fit is trimmed to the space left, and everything after it is dropped.
+    After pack() has been consumed, used, included and trimmed describe the result.
+    """
+
+    TRIM_MARKER = "\n... [trimmed to fit budget] ..."
+
+    def __init__(self, limit: int, unit: str = 'tokens', order: str = 'selection') -> None:
+        if unit not in BUDGET_UNITS:
+            raise ValueError(f"Unknown budget unit: {unit}")
+        if order not in BUDGET_ORDERS:
+            raise ValueError(f"Unknown budget order: {order}")
+        self.limit = limit
+        self.unit = unit
+        self.order = order
+        self.used = 0
+        self.included = 0
+        self.trimmed = 0
+
+    def order_files(self, file_paths: List[str]) -> List[str]:
+        """
+        Sort file paths by priority.
+
+        'selection' keeps the given order, 'size' puts the smallest files first so that
+        as many files as possible fit, and 'recency' puts recently modified files first.
+        """
+        if self.order == 'selection':
+            return list(file_paths)
+
+        def stat_key(file_path: str) -> float:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return float('inf')
+            return stat.st_size if self.order == 'size' else -stat.st_mtime
+
+        return sorted(file_paths, key=stat_key)
+
+    def pack(self, entries: Iterable[Tuple[str, str]], fmt: str = 'markdown') -> Iterator[Tuple[str, str]]:
+        """
+        Yield the (file path, chunk) entries that fit in the budget, trimming the last one.
+
+        :param entries: (file path, chunk) tuples in priority order.
+        :param fmt: Format of the chunks, either 'markdown' or 'plain'.
+        """
+        self.used = 0
+        self.included = 0
+        self.trimmed = 0
+        for file_path, chunk in entries:
+            cost = measure(chunk, self.unit)
+            if self.used + cost > self.limit:
+                chunk = self._trim(chunk, fmt, self.limit - self.used)
+                if chunk is None:
+                    return
+                cost = measure(chunk, self.unit)
+                self.trimmed += 1
+            self.used += cost
+            self.included += 1
+            yield file_path, chunk
+            if self.used >= self.limit:
+                return
+
+    def _trim(self, chunk: str, fmt: str, room: int) -> Optional[str]:
+        """
+        Cut a chunk down to room units, keeping its header and closing fence.
+
+        :return: The trimmed chunk, or None if not even the header and one line fit.
+        """
+        closing = "\n```\n\n" if fmt == 'markdown' else "\n\n"
+        room -= measure(self.TRIM_MARKER + closing, self.unit)
+        if room <= 0:
+            return None
+        header_end = chunk.index('\n', chunk.index('\n') + 1) if fmt == 'markdown' else chunk.index('\n')
+        body = chunk[:len(chunk) - len(closing)]
+        cut = body[:room * 4 if self.unit == 'tokens' else room]
+        while cut and measure(cut, self.unit) > room:
+            cut = cut[:len(cut) * 9 // 10]
+        if '\n' in cut[header_end + 1:]:
+            cut = cut[:cut.rfind('\n')]
+        if len(cut) <= header_end:
+            return None
+        return cut + self.TRIM_MARKER + closing
+
+
+class BudgetMeter:
+    """
+    Running total of the size of the selected files, in budget units.
+
+    Each file's cost is remembered together with the chunk it was measured on. The
+    content cache hands out the same chunk object until a file changes, so a rebuild
+    only measures files that were added or modified.
+    """
+
+    def __init__(self, unit: str = 'tokens') -> None:
+        self.unit = unit
+        self.total = 0
+        self._costs: Dict[str, Tuple[str, int]] = {}
+
+    def update(self, entries: Iterable[Tuple[str, str]]) -> int:
+        """
+        Recompute the total for the given (file path, chunk) entries.
+
+        :return: The new total.
+        """
+        costs = {}
+        total = 0
+        for file_path, chunk in entries:
+            known = self._costs.get(file_path)
+            cost = known[1] if known is not None and known[0] is chunk else measure(chunk, self.unit)
+            costs[file_path] = (chunk, cost)
+            total += cost
+        self._costs = costs
+        self.total = total
+        return total
+
+
+# ----------------------------
+# Sharded Export
+# ----------------------------
+
+SHARD_MANIFEST = 'manifest.json'
+
+
+def _load_manifest(out_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(out_dir, SHARD_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_shard(path: str, chunks: List[str]) -> None:
+    temp_path = path + '.part'
+    with open(temp_path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, path)
+
+
+def _write_manifest(out_dir: str, manifest: Dict[str, Any]) -> None:
+    path = os.path.join(out_dir, SHARD_MANIFEST)
+    temp_path = path + '.part'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def export_shards(file_paths: List[str], out_dir: str, max_size: int, unit: str = 'bytes', fmt: str = 'markdown',
+                  cache: Optional[FileContentCache] = None, workers: int = 1,
+                  max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                  progress: Optional[Callable[[int, int], bool]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Split the concatenated content into shards of at most max_size units.
+
+    Shards only break between files; a single file larger than max_size gets a shard
+    of its own. A manifest.json next to the shards maps each shard to its files and
+    their mtime/size. On re-export, leading shards whose files are all unchanged are
+    kept without reading those files again, and any other shard whose file list is
+    unchanged is not rewritten. Before the first shard is overwritten, the manifest is
+    cut back to the shards already known to be current, so a cancelled export never
+    leaves a manifest describing shard files it has replaced.
+
+    :param file_paths: Files to export, in output order.
+    :param out_dir: Directory receiving the shards and the manifest.
+    :param max_size: Maximum size of a shard.
+    :param unit: Unit of max_size, 'bytes' or 'tokens'.
+    :param fmt: Output format, either 'markdown' or 'plain'.
+    :param cache: Optional per-file cache; only files missing from it are read from disk.
+    :param workers: Number of threads reading files ahead of the writer.
+    :param max_file_bytes: Size above which only a head/tail excerpt of a file is used.
+    :param progress: Optional callback receiving (files done, total files); returning
+                     False cancels the export.
+    :return: The new manifest, or None if the export was cancelled.
+    """
+    if fmt not in ('markdown', 'plain'):
+        raise ValueError(f"Unknown format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    extension = '.md' if fmt == 'markdown' else '.txt'
+    settings = {'format': fmt, 'unit': unit, 'max_size': max_size, 'max_file_bytes': max_file_bytes}
+
+    entries = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            logging.error(f"Error reading file {file_path}: {e}")
+            continue
+        entries.append({'path': file_path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size})
+
+    previous = _load_manifest(out_dir)
+    previous_shards = []
+    if previous is not None and all(previous.get(key) == value for key, value in settings.items()):
+        previous_shards = previous.get('shards', [])
+
+    shards: List[Dict[str, Any]] = []
+    done = 0
+    # Reuse the unchanged prefix: same files, same stats, same shard boundaries
+    for shard in previous_shards:
+        count = len(shard['files'])
+        if (entries[done:done + count] != shard['files']
+                or not os.path.exists(os.path.join(out_dir, shard['name']))):
+            break
+        shards.append(shard)
+        done += count
+    reused = len(shards)
+    if progress is not None and not progress(done, len(entries)):
+        return None
+
+    committed = False
+
+    def flush(chunks: List[str], files: List[Dict[str, Any]], size: int) -> None:
+        nonlocal committed
+        name = f"shard-{len(shards) + 1:04d}{extension}"
+        index = len(shards)
+        unchanged = (index < len(previous_shards) and previous_shards[index]['files'] == files
+                     and os.path.exists(os.path.join(out_dir, name)))
+        if not unchanged:
+            if not committed and previous is not None:
+                _write_manifest(out_dir, dict(settings, shards=list(shards)))
+            committed = True
+            _write_shard(os.path.join(out_dir, name), chunks)
+        shards.append({'name': name, 'size': size, 'files': files})
+
+    position = 0 if fmt == 'markdown' else 1
+    remaining = entries[done:]
+    chunks: List[str] = []
+    files: List[Dict[str, Any]] = []
+    size = 0
+    rendered = _iter_rendered([entry['path'] for entry in remaining], cache, workers, max_file_bytes)
+    for entry, (_, file_chunks) in zip(remaining, rendered):
+        done += 1
+        if file_chunks is not None:
+            chunk = file_chunks[position]
+            cost = measure(chunk, unit)
+            if chunks and size + cost > max_size:
+                flush(chunks, files, size)
+                chunks, files, size = [], [], 0
+            chunks.append(chunk)
+            files.append(entry)
+            size += cost
+        if progress is not None and not progress(done, len(entries)):
+            return None
+    if chunks:
+        flush(chunks, files, size)
+
+    # Remove shards left over from a previous, larger or cancelled export
+    current_names = {shard['name'] for shard in shards}
+    leftover = re.compile(r'shard-\d{4}' + re.escape(extension) + r'(?:\.part)?$')
+    for name in os.listdir(out_dir):
+        if name not in current_names and leftover.match(name):
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(out_dir, name))
+
+    manifest = dict(settings, shards=shards)
+    _write_manifest(out_dir, manifest)
+    logging.info(f"Exported {len(shards)} shards to {out_dir} ({reused} reused without reading)")
+    return manifest
+
+
+# ----------------------------
+# Delta Export
+# ----------------------------
+
+SNAPSHOT_VERSION = 1
+
+
+class ExportDelta:
+    """
+    The files added, modified and removed since a previous export or a git ref.
+
+    Paths are absolute; added and modified keep the order of the selection.
+    """
+
+    def __init__(self, since: str) -> None:
+        self.since = since
+        self.added: List[str] = []
+        self.modified: List[str] = []
+        self.removed: List[str] = []
+        self.unchanged = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.removed)
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.modified)} modified, {len(self.removed)} removed, "
+                f"{self.unchanged} unchanged")
+
+
+def load_export_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Read a snapshot written by save_export_snapshot; a missing or unreadable one is empty.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return {}
+    return snapshot
+
+
+def save_export_snapshot(path: str, snapshot: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.part'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(temp_path, path)
+
+
+def _new_snapshot(files: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {'version': SNAPSHOT_VERSION, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'files': files}
+
+
+def delta_since_snapshot(file_paths: List[str], snapshot: Dict[str, Any], cache: Optional[FileContentCache] = None,
+                         workers: int = 1, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                         progress: Optional[Callable[[int, int], bool]] = None
+                         ) -> Optional[Tuple[ExportDelta, Dict[str, Any]]]:
+    """
+    Compare the given files with the snapshot of a previous export.
+
+    Files whose mtime and size match the snapshot are unchanged without being read.
+    The others are read (through the cache) and compared by content hash, so a file
+    that was only touched is not reported. Binary and excerpted files have no hash and
+    count as modified whenever their mtime or size changed. Files in the snapshot that
+    are no longer given are reported as removed.
+
+    :param file_paths: Files of the new export, in output order.
+    :param snapshot: A snapshot from load_export_snapshot; empty reports every file as added.
+    :param cache: Optional per-file cache; only files missing from it are read from disk.
+    :param workers: Number of threads reading files.
+    :param max_file_bytes: Size above which only a head/tail excerpt of a file is used.
+    :param progress: Optional callback receiving (files done, total files); returning
+                     False cancels the comparison.
+    :return: The delta and the snapshot of the given files, or None if cancelled.
+    """
+    previous = snapshot.get('files', {})
+    delta = ExportDelta(f"the export of {snapshot['created']}" if snapshot.get('created') else '')
+    files: Dict[str, Dict[str, Any]] = {}
+    changed = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            logging.error(f"Error reading file {file_path}: {e}")
+            continue
+        entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': ''}
+        old = previous.get(file_path)
+        if old is not None and old.get('mtime_ns') == entry['mtime_ns'] and old.get('size') == entry['size']:
+            files[file_path] = old
+            delta.unchanged += 1
+        else:
+            files[file_path] = entry
+            changed.append(file_path)
+    done = len(file_paths) - len(changed)
+    if progress is not None and not progress(done, len(file_paths)):
+        return None
+
+    changed_paths = set()
+    for file_path, chunks in _iter_rendered(changed, cache, workers, max_file_bytes):
+        done += 1
+        if chunks is None:
+            del files[file_path]
+        else:
+            files[file_path]['hash'] = chunks[2]
+            old = previous.get(file_path)
+            if old is not None and chunks[2] and old.get('hash') == chunks[2]:
+                delta.unchanged += 1
+            else:
+                changed_paths.add(file_path)
+        if progress is not None and not progress(done, len(file_paths)):
+            return None
+
+    for file_path in file_paths:
+        if file_path in changed_paths:
+            (delta.modified if file_path in previous else delta.added).append(file_path)
+    delta.removed = sorted(path for path in previous if path not in files)
+    return delta, _new_snapshot(files)
+
+
+def _git(cwd: str, *args: str) -> str:
+    result = subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, encoding='utf-8',
+                            errors='surrogateescape')
+    if result.returncode != 0:
+        raise ValueError(f"git {args[0]} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def delta_since_git_ref(file_paths: List[str], ref: str, patterns: Any = None, hidden_dirs: Iterable[str] = (),
+                        ignore: Optional[IgnoreMatcher] = None, roots: Optional[List[str]] = None) -> ExportDelta:
+    """
+    Compare the given files with a git ref, using the git command line.
+
+    Files not tracked at the ref are added, files whose working tree content differs
+    from it are modified, and files deleted since the ref are removed if the walk that
+    selected the files would have listed them: below one of the roots, not hidden, not
+    in hidden_dirs, matching the name patterns and not ignored.
+
+    :param file_paths: Files of the new export, in output order.
+    :param ref: Any revision git accepts, e.g. HEAD~3, main or a tag.
+    :param patterns: Name filter patterns or a NameMatcher; None reports deleted files of any name.
+    :param hidden_dirs: Directory names the selection never enters.
+    :param ignore: Optional IgnoreMatcher (or WorkspaceIgnoreMatcher) of the selection.
+    :param roots: Directories the files were selected from; defaults to their common directory.
+    :return: The delta; raises ValueError if git fails or the files are not in a repository.
+    """
+    delta = ExportDelta(ref)
+    if not file_paths:
+        return delta
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in file_paths])
+    top = os.path.realpath(_git(base, 'rev-parse', '--show-toplevel').strip())
+    try:
+        _git(top, 'rev-parse', '--verify', '--quiet', f"{ref}^{{commit}}")
+    except ValueError:
+        raise ValueError(f"Unknown revision: {ref}") from None
+
+    def key(relative: str) -> str:
+        return os.path.normcase(os.path.join(top, os.path.normpath(relative)))
+
+    tracked = {key(path) for path in _git(top, 'ls-tree', '-r', '-z', '--name-only', ref).split('\0') if path}
+    modified = set()
+    deleted = []
+    fields = _git(top, 'diff', '--name-status', '-z', '--no-renames', ref, '--').split('\0')
+    for status, path in zip(fields[::2], fields[1::2]):
+        if status == 'D':
+            deleted.append(os.path.join(top, os.path.normpath(path)))
+        else:
+            modified.add(key(path))
+
+    for file_path in file_paths:
+        file_key = os.path.normcase(os.path.realpath(file_path))
+        if file_key not in tracked:
+            delta.added.append(file_path)
+        elif file_key in modified:
+            delta.modified.append(file_path)
+        else:
+            delta.unchanged += 1
+
+    matcher = None
+    if patterns is not None:
+        matcher = patterns if isinstance(patterns, NameMatcher) else NameMatcher(patterns)
+    hidden_dirs = set(hidden_dirs)
+    real_roots = [(root, os.path.realpath(root)) for root in (roots or [base])]
+
+    def selectable(path: str) -> bool:
+        for root, real_root in real_roots:
+            if os.path.commonpath([real_root, path]) == real_root:
+                break
+        else:
+            return False
+        parts = os.path.relpath(path, real_root).split(os.sep)
+        if any(part.startswith('.') for part in parts) or hidden_dirs.intersection(parts[:-1]):
+            return False
+        if matcher is not None and not matcher.matches(parts[-1]):
+            return False
+        return ignore is None or not ignore.is_ignored('/'.join([root.replace(os.sep, '/').rstrip('/')] + parts),
+                                                       False)
+
+    delta.removed = sorted(path for path in deleted if selectable(path))
+    return delta
+
+
+def write_delta(delta: ExportDelta, out: TextIO, fmt: str = 'markdown', cache: Optional[FileContentCache] = None,
+                progress: Optional[Callable[[int, int], bool]] = None, workers: int = 1,
+                max_file_bytes: int = DEFAULT_MAX_FILE_BYTES) -> bool:
+    """
+    Write an incremental document: a summary, the removed paths, then the full content of
+    the added and the modified files.
+
+    :param delta: The changes to write.
+    :param out: Writable text stream receiving the document.
+    :param fmt: Output format, either 'markdown' or 'plain'.
+    :param cache: Optional per-file cache; only files missing from it are read from disk.
+    :param progress: Optional callback receiving (files done, total files); returning
+                     False cancels the write.
+    :param workers: Number of threads reading files ahead of the writer.
+    :param max_file_bytes: Size above which only a head/tail excerpt of a file is used.
+    :return: True if every file was processed, False if the write was cancelled.
+    """
+    if fmt not in ('markdown', 'plain'):
+        raise ValueError(f"Unknown format: {fmt}")
+    since = f" since {delta.since}" if delta.since else ""
+    if fmt == 'markdown':
+        out.write(f"# Changes{since}\n\n{delta.summary()}.\n\n")
+    else:
+        out.write(f"Changes{since}: {delta.summary()}\n\n")
+    if delta.removed:
+        if fmt == 'markdown':
+            out.write("# Removed\n\n" + ''.join(f"- `{display_path(path)}`\n" for path in delta.removed) + "\n")
+        else:
+            out.write("Removed:\n" + ''.join(f"{display_path(path)}\n" for path in delta.removed) + "\n")
+
+    position = 0 if fmt == 'markdown' else 1
+    total = len(delta.added) + len(delta.modified)
+    done = 0
+    for title, file_paths in (("Added", delta.added), ("Modified", delta.modified)):
+        if not file_paths:
+            continue
+        out.write(f"# {title}\n\n" if fmt == 'markdown' else f"{title}:\n\n")
+        for _, chunks in _iter_rendered(file_paths, cache, workers, max_file_bytes):
+            done += 1
+            if chunks is not None:
+                out.write(chunks[position])
+            if progress is not None and not progress(done, total):
+                return False
+    return True
+
+
+# ----------------------------
+# Command Line Entry Point
+# ----------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Concatenate the matching files under one or more root directories without starting the GUI.
+
+    With several roots, the roots are walked in parallel and files are named with the
+    label of their root (see Workspace); a single root keeps names relative to the
+    working directory.
+
+    :param argv: Command line arguments; defaults to sys.argv[1:].
+    :return: Process exit code.
+    """
+    parser = argparse.ArgumentParser(description="Concatenate source files into markdown or plain text.")
+    parser.add_argument('roots', nargs='+', metavar='root', help="root directory to scan (repeatable)")
+    parser.add_argument('-i', '--include', action='append', metavar='GLOB',
+                        help=f"file name pattern to include (repeatable, default: {' '.join(DEFAULT_EXTENSIONS)})")
+    parser.add_argument('-x', '--hidden-dir', action='append', metavar='NAME', dest='hidden_dirs',
+                        help=f"directory name to skip (repeatable, default: {' '.join(DEFAULT_HIDDEN_DIRS)})")
+    parser.add_argument('-f', '--format', choices=['markdown', 'plain'], default='markdown', help="output format")
+    parser.add_argument('-o', '--output', metavar='FILE', help="write to FILE instead of stdout")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="parallel file reads")
+    parser.add_argument('--max-file-bytes', type=int, default=DEFAULT_MAX_FILE_BYTES,
+                        help="excerpt files larger than this many bytes (0 = no limit)")
+    parser.add_argument('--budget', type=int, metavar='N', help="pack the output into at most N budget units")
+    parser.add_argument('--budget-unit', choices=BUDGET_UNITS, default='tokens', help="unit of --budget")
+    parser.add_argument('--budget-order', choices=BUDGET_ORDERS, default='selection',
+                        help="which files to keep first when the budget is exceeded")
+    parser.add_argument('--no-gitignore', action='store_true', help="do not apply .gitignore files")
+    parser.add_argument('--scan-processes', action='store_true',
+                        help="walk several roots in a process pool instead of a thread pool")
+    parser.add_argument('--dedup', action='store_true',
+                        help="replace files identical to an earlier one with a reference to it (not with --shards)")
+    parser.add_argument('--language', action='append', metavar='EXT=LANG', default=[],
+                        help="extra extension to code fence language mapping (repeatable, e.g. .ts=typescript)")
+    parser.add_argument('--shards', metavar='DIR', help="write shards and a manifest to DIR instead")
+    parser.add_argument('--shard-size', type=int, default=512 * 1024, metavar='N',
+                        help="maximum shard size (default: 524288)")
+    parser.add_argument('--shard-unit', choices=BUDGET_UNITS[::-1], default='bytes', help="unit of --shard-size")
+    parser.add_argument('--delta', metavar='SNAPSHOT',
+                        help="write only the files changed since the export recorded in SNAPSHOT, then update it")
+    parser.add_argument('--since', metavar='REF', help="write only the files changed since a git ref")
+    args = parser.parse_args(argv)
+    for root in args.roots:
+        if not os.path.isdir(root):
+            parser.error(f"not a directory: {root}")
+
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+    register_languages(args.language)
+
+    hidden_dirs = args.hidden_dirs or DEFAULT_HIDDEN_DIRS
+    workspace = Workspace(args.roots)
+    if len(workspace.roots) > 1:
+        set_workspace(workspace)
+    file_paths = [path for path, _ in workspace.scan(args.include or DEFAULT_EXTENSIONS, hidden_dirs,
+                                                     not args.no_gitignore, processes=args.scan_processes)]
+    if args.shards:
+        export_shards(file_paths, args.shards, args.shard_size, args.shard_unit, args.format,
+                      workers=args.workers, max_file_bytes=args.max_file_bytes)
+        return 0
+
+    if args.delta and args.since:
+        parser.error("--delta and --since cannot be combined")
+    snapshot = None
+    delta = None
+    if args.delta:
+        cache = FileContentCache()
+        delta, snapshot = delta_since_snapshot(file_paths, load_export_snapshot(args.delta), cache, args.workers,
+                                               args.max_file_bytes)
+    elif args.since:
+        cache = None
+        try:
+            delta = delta_since_git_ref(file_paths, args.since, args.include or DEFAULT_EXTENSIONS, hidden_dirs,
+                                        WorkspaceIgnoreMatcher(workspace, hidden_dirs, not args.no_gitignore),
+                                        workspace.roots)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error comparing with {args.since}: {e}")
+            return 2
+
+    def write_output(out: TextIO) -> None:
+        if delta is not None:
+            write_delta(delta, out, args.format, cache, workers=args.workers, max_file_bytes=args.max_file_bytes)
+            return
+        if args.budget is None:
+            write_concatenated(file_paths, out, args.format, workers=args.workers,
+                               max_file_bytes=args.max_file_bytes, dedup=args.dedup)
+            return
+        budget = Budget(args.budget, args.budget_unit, args.budget_order)
+        position = 1 if args.format == 'markdown' else 2
+        entries = ((chunks[0], chunks[position])
+                   for chunks in iter_file_chunks(budget.order_files(file_paths), workers=args.workers,
+                                                  max_file_bytes=args.max_file_bytes, dedup=args.dedup))
+        for _, chunk in budget.pack(entries, args.format):
+            out.write(chunk)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+            write_output(f)
+    else:
+        try:
+            write_output(sys.stdout)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # The reader went away (e.g. piped into head); silence the flush at exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 1
+    if snapshot is not None:
+        save_export_snapshot(args.delta, snapshot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,51 +1,85 @@
 import os
 import sys
+import io
+import time
+import pstats
+import cProfile
+import hashlib
 import logging
-import markdown
+import tempfile
+import itertools
+import contextlib
 import configparser
 
-from typing import List, Tuple, Optional, Set, Any
+from typing import List, Tuple, Optional, Set, Dict, Any, Iterable, Iterator, Callable, TextIO
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTreeView, QTextEdit, QToolBar, QWidget,
     QAction, QAbstractItemView, QSplitter, QMessageBox, QDialog, QFileDialog,
-    QTabWidget, QLabel, QSpinBox, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox, QLineEdit
+    QTabWidget, QLabel, QSpinBox, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox, QLineEdit,
+    QProgressDialog, QCheckBox, QInputDialog, QListWidget, QListWidgetItem
 )
-from PyQt5.QtGui import QFont, QIcon
+from PyQt5.QtGui import QFont, QIcon, QKeySequence, QTextCursor
 from PyQt5.QtCore import QSortFilterProxyModel
 from PyQt5.QtWidgets import QFileSystemModel
-from PyQt5.QtCore import Qt, QDir, QSize, QModelIndex, QObject, QSettings
+from PyQt5.QtCore import (
+    Qt, QDir, QSize, QModelIndex, QObject, QSettings, QFileSystemWatcher, QStandardPaths, QRunnable, QThreadPool,
+    QTimer, pyqtSignal
+)
 
-# ----------------------------
-# Helper Functions
-# ----------------------------
+from concatenator import (
+    BUDGET_ORDERS, BUDGET_UNITS, DEFAULT_EXTENSIONS, DEFAULT_HIDDEN_DIRS, DEFAULT_MAX_FILE_BYTES, Budget, BudgetMeter,
+    FileContentCache, NameMatcher, PersistentIndex, PipelineStats, RenderCache, SelectionTrie,
+    TrigramIndex, Workspace, WorkspaceIgnoreMatcher,
+    concatenate_files, delta_since_git_ref, delta_since_snapshot, display_path, export_shards, load_export_snapshot,
+    register_languages, get_language_from_extension, iter_concatenated, iter_file_chunks, iter_matching_file_sizes,
+    new_markdown_converter, render_markdown_chunk, save_export_snapshot, set_workspace, write_concatenated,
+    write_delta
+)
 
-def get_language_from_extension(ext: str) -> Optional[str]:
-    """
-    Map file extensions to programming languages for syntax highlighting.
+# The application's own source is never concatenated, even when it is checked
+APP_FILE = os.path.abspath(__file__).replace(os.sep, '/')
 
-    :param ext: File extension (e.g., '.py', '.js').
-    :return: Corresponding language string or empty string if not found.
-    """
-    mapping = {
-        '.py': 'python',
-        '.js': 'javascript',
-        '.json': 'json',
-        '.html': 'html',
-        '.qss': 'qss',
-        '.vue': 'vue'
-    }
-    return mapping.get(ext.lower(), '')
+# Levels offered in the settings dialog; rebuild timings are logged at INFO
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
 
 # ----------------------------
 # Models
 # ----------------------------
 
 class CheckableFileSystemModel(QFileSystemModel):
+    """
+    File system model with checkboxes on files and tri-state checkboxes on folders.
+
+    The selection is a SelectionTrie, so a folder's state and aggregate counts are
+    looked up rather than recomputed. Checking a folder walks it once on disk with the
+    model's filters (name_matcher, hidden_dirs, ignore_matcher) and then marks the
+    whole subtree in one operation. A folder above several workspace roots has those
+    roots walked in parallel instead. Folders that only hold individually checked or
+    restored files are walked on scan_pool, off the GUI thread.
+    """
+    # Emitted once per user action whenever the set of checked files changes.
+    checked_files_changed = pyqtSignal()
+
     def __init__(self, extensions: Optional[List[str]] = None, parent: Optional[QObject] = None) -> None:
         super().__init__(parent)
-        self.checked_files: Set[str] = set()
-        self.extensions = extensions or ['*.py', '*.js']
+        self.checked_files = SelectionTrie()
+        # Filters applied when a folder is walked; kept in sync with DirectoryFilterProxyModel
+        self.hidden_dirs: List[str] = DEFAULT_HIDDEN_DIRS
+        self.ignore_matcher: Optional[WorkspaceIgnoreMatcher] = None
+        self.workspace: Optional[Workspace] = None
+        # Order in which files were checked, used by the budget's 'selection' priority
+        self.check_order: Dict[str, int] = {}
+        self._check_serial = itertools.count()
+        self._batch_depth = 0
+        self._batch_dirty = False
+        # Background walks of folders holding checked files, by folder
+        self.scan_pool = QThreadPool(self)
+        self.scan_pool.setMaxThreadCount(2)
+        self._scan_tasks: Dict[str, 'FolderScanTask'] = {}
+        self._scan_generation = 0
+        self.extensions = extensions or DEFAULT_EXTENSIONS
+        self.name_matcher = NameMatcher(self.extensions)
         self.setNameFilters(self.extensions)
         self.setNameFilterDisables(False)
 
@@ -56,24 +90,203 @@ class CheckableFileSystemModel(QFileSystemModel):
         return flags
 
     def data(self, index: QModelIndex, role: int) -> Any:
-        if role == Qt.CheckStateRole and not self.isDir(index):
+        if role == Qt.CheckStateRole:
             file_path = self.filePath(index)
-            return Qt.Checked if file_path in self.checked_files else Qt.Unchecked
+            if not self.isDir(index):
+                return Qt.Checked if file_path in self.checked_files else Qt.Unchecked
+            selected, total, _, _, complete = self.checked_files.counts(file_path)
+            if selected == 0:
+                return Qt.Unchecked
+            return Qt.Checked if complete and selected == total else Qt.PartiallyChecked
+        if role == Qt.ToolTipRole and index.column() == 0 and self.isDir(index):
+            selected, total, selected_bytes, total_bytes, complete = self.checked_files.counts(self.filePath(index))
+            if complete:
+                return (f"{selected:,} of {total:,} files selected "
+                        f"({selected_bytes / 1024:,.1f} of {total_bytes / 1024:,.1f} KB)")
+            return f"{selected:,} files selected ({selected_bytes / 1024:,.1f} KB)"
         return super().data(index, role)
 
     def setData(self, index: QModelIndex, value: Any, role: int) -> bool:
         if role == Qt.CheckStateRole:
             file_path = self.filePath(index)
+            if self.isDir(index):
+                self.set_directory_checked(file_path, value)
+                return True
             if value == Qt.Checked:
-                self.checked_files.add(file_path)
+                self.checked_files.add(file_path, self.size(index))
+                self.check_order[file_path] = next(self._check_serial)
+                # Know the folder's other files, so checking them all makes it Checked
+                self.scan_selected_folders([os.path.dirname(file_path)])
             else:
                 self.checked_files.discard(file_path)
-            self.dataChanged.emit(index, index)
+            if self._batch_depth:
+                self._batch_dirty = True
+            else:
+                # Folders above the file may change between checked, partial and unchecked
+                while index.isValid():
+                    self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+                    index = index.parent()
+                self.checked_files_changed.emit()
             return True
         return super().setData(index, value, role)
 
+    def set_directory_checked(self, directory: str, state: Qt.CheckState, rescan: bool = False) -> None:
+        """
+        Check or uncheck every eligible file below a directory, emitting a single change.
+
+        The directory is walked on disk the first time it is checked (or after
+        forget_scans()); later checks reuse the files registered by that walk.
+
+        :param directory: Path of the directory.
+        :param state: Qt.Checked or Qt.Unchecked.
+        :param rescan: Walk the directory again even if it was walked before.
+        """
+        with self.batch():
+            if state == Qt.Checked:
+                if rescan or not self.checked_files.is_complete(directory):
+                    self.checked_files.scan(directory, self._scan(directory))
+                changed = self.checked_files.set_subtree(directory, True)
+                for file_path in sorted(changed):
+                    self.check_order[file_path] = next(self._check_serial)
+            else:
+                changed = self.checked_files.set_subtree(directory, False)
+            if changed:
+                self._batch_dirty = True
+
+    def scan_selected_folders(self, directories: Iterable[str]) -> None:
+        """
+        Walk the given folders that hold checked files but were never walked, in the background.
+
+        Until a folder is walked its totals only count the files checked in it, so it
+        could never show as fully checked, e.g. after the selection was restored. The
+        views are repainted as each walk finishes.
+
+        :param directories: Folders to walk if needed.
+        """
+        for directory in directories:
+            if directory in self._scan_tasks:
+                continue
+            if self.checked_files.counts(directory)[0] and not self.checked_files.is_complete(directory):
+                task = FolderScanTask(self._scan_generation, directory, self._scan)
+                task.signals.finished.connect(self._on_folder_scanned)
+                self._scan_tasks[directory] = task
+                self.scan_pool.start(task)
+
+    def _on_folder_scanned(self, generation: int, directory: str, files: List[Tuple[str, int]]) -> None:
+        """
+        Register the files found by a background walk, unless the filters changed meanwhile.
+        """
+        if generation != self._scan_generation:
+            return
+        self._scan_tasks.pop(directory, None)
+        if not self.checked_files.is_complete(directory):
+            self.checked_files.scan(directory, files)
+            self._emit_check_states_changed()
+
+    def cancel_scans(self) -> None:
+        """
+        Stop the background walks in flight and discard their results.
+        """
+        self._scan_generation += 1
+        for task in self._scan_tasks.values():
+            task.cancel()
+        self._scan_tasks.clear()
+
+    def _scan(self, directory: str) -> Iterable[Tuple[str, int]]:
+        """
+        Walk a directory with the model's filters; only the workspace roots below it are walked.
+        """
+        directories = self.workspace.roots_below(directory) if self.workspace is not None else [directory]
+        if len(directories) == 1:
+            return iter_matching_file_sizes(directories[0], self.name_matcher, self.hidden_dirs, self.ignore_matcher)
+        return self.workspace.scan(self.extensions, self.hidden_dirs, self.ignore_matcher is not None, directories)
+
+    def forget_scans(self) -> None:
+        """
+        Drop the folder totals registered by earlier walks, e.g. after the filters changed.
+        """
+        self.cancel_scans()
+        self.checked_files.retain(lambda file_path: True)
+        self._emit_check_states_changed()
+
+    def begin_batch(self) -> None:
+        """
+        Start a batch of check-state changes.
+
+        While a batch is open, setData() only updates checked_files; the views and
+        checked_files_changed are notified once when the outermost batch ends.
+        """
+        self._batch_depth += 1
+
+    def end_batch(self) -> None:
+        """
+        Close a batch opened with begin_batch() and emit a single coalesced change.
+        """
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._batch_dirty:
+            self._batch_dirty = False
+            self._emit_check_states_changed()
+            self.checked_files_changed.emit()
+
+    def _emit_check_states_changed(self) -> None:
+        """
+        Notify attached views that check states changed without one signal per file.
+
+        A multi-row dataChanged makes the views repaint their whole viewport, which
+        picks up the new state of every visible item.
+        """
+        root_index = self.index(self.rootPath())
+        row_count = self.rowCount(root_index)
+        if row_count:
+            self.dataChanged.emit(self.index(0, 0, root_index),
+                                  self.index(row_count - 1, 0, root_index),
+                                  [Qt.CheckStateRole])
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Context manager wrapping begin_batch() / end_batch().
+        """
+        self.begin_batch()
+        try:
+            yield
+        finally:
+            self.end_batch()
+
+    def set_checked_many(self, file_paths: Iterable[str], state: Qt.CheckState) -> None:
+        """
+        Set the check state of many files at once, emitting a single change.
+
+        :param file_paths: Paths of the files to update.
+        :param state: Qt.Checked or Qt.Unchecked.
+        """
+        with self.batch():
+            before = len(self.checked_files)
+            if state == Qt.Checked:
+                for file_path in file_paths:
+                    if file_path not in self.checked_files:
+                        self.checked_files.add(file_path, self._file_size(file_path))
+                        self.check_order[file_path] = next(self._check_serial)
+            else:
+                self.checked_files.difference_update(file_paths)
+            if len(self.checked_files) != before:
+                self._batch_dirty = True
+
+    @staticmethod
+    def _file_size(file_path: str) -> int:
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+
     def get_checked_files(self) -> List[str]:
-        return list(self.checked_files)
+        return [file_path for file_path in self.checked_files if file_path != APP_FILE]
+
+    def get_checked_files_in_selection_order(self) -> List[str]:
+        """
+        Return the checked files ordered by when they were checked, oldest first.
+        """
+        return sorted(self.get_checked_files(), key=lambda file_path: self.check_order.get(file_path, 0))
 
     def update_extensions(self, new_extensions: List[str]) -> None:
         """
@@ -82,26 +295,56 @@ class CheckableFileSystemModel(QFileSystemModel):
         :param new_extensions: List of new file extension patterns (e.g., ['*.py', '*.js']).
         """
         self.extensions = new_extensions
+        self.name_matcher = NameMatcher(self.extensions)
         self.setNameFilters(self.extensions)
         self.setNameFilterDisables(False)
         # Clear checked files that no longer match the new extensions
-        self.checked_files = {f for f in self.checked_files if any(fnmatch.fnmatch(f, pattern) for pattern in self.extensions)}
-        self.layoutChanged.emit()
+        self.cancel_scans()
+        matches = self.name_matcher.matches
+        self.checked_files.retain(lambda f: matches(os.path.basename(f)))
+        # A bare layoutChanged (without layoutAboutToBeChanged) crashes the proxy model
+        self._emit_check_states_changed()
 
-import fnmatch
 
 class DirectoryFilterProxyModel(QSortFilterProxyModel):
     def __init__(self, hidden_dirs: Optional[List[str]] = None, parent: Optional[QObject] = None) -> None:
         super().__init__(parent)
-        self.hidden_dirs = hidden_dirs or ['__pycache__', '.git']
+        self.hidden_dirs = hidden_dirs or DEFAULT_HIDDEN_DIRS
+        self.ignore_matcher: Optional[WorkspaceIgnoreMatcher] = None
+        self.workspace: Optional[Workspace] = None
+
+    def set_workspace(self, workspace: Optional[Workspace]) -> None:
+        """
+        Show only the workspace roots and the folders leading to them, and re-filter the tree.
+        """
+        self.workspace = workspace
+        self.invalidateFilter()
+
+    def set_ignore_matcher(self, matcher: Optional[WorkspaceIgnoreMatcher]) -> None:
+        """
+        Replace the .gitignore rules applied to the tree and re-filter it.
+
+        :param matcher: The matcher for the current roots, or None to show everything.
+        """
+        self.ignore_matcher = matcher
+        self.invalidateFilter()
 
     def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
         model = self.sourceModel()
         index = model.index(source_row, 0, source_parent)
-        if model.isDir(index):
+        if self.workspace is not None:
+            file_path = model.filePath(index)
+            if file_path in self.workspace.roots:
+                return True
+            if self.workspace.root_of(file_path) is None:
+                return self.workspace.is_ancestor(file_path)
+        is_dir = model.isDir(index)
+        if is_dir:
             dir_name = model.fileName(index)
             if dir_name in self.hidden_dirs:
                 return False
+        if self.ignore_matcher is not None and self.ignore_matcher.is_ignored(model.filePath(index), is_dir):
+            return False
         return super().filterAcceptsRow(source_row, source_parent)
 
 # ----------------------------
@@ -111,11 +354,25 @@ class DirectoryFilterProxyModel(QSortFilterProxyModel):
 class MarkdownView(QWidget):
     """
     A view to display markdown content rendered as HTML.
+
+    Content set through set_html_sections() is virtualized: only the file sections
+    around the visible area are pushed into the QTextEdit, and further sections are
+    rendered on demand as the user scrolls. Sections that scroll more than a page
+    out of view are removed again, so the document stays at most WINDOW_PAGES pages
+    long. A combo box indexes every section so any file can be jumped to directly.
     """
 
+    # Approximate amount of HTML pushed into the text edit per on-demand page
+    PAGE_BYTES = 256 * 1024
+    # Pages kept in the text edit; beyond that, the pages farthest from the viewport are dropped
+    WINDOW_PAGES = 3
+
     def __init__(self, font_size=12, parent=None):
         super().__init__(parent)
         layout = QVBoxLayout()
+        self.section_combo = QComboBox()
+        self.section_combo.setToolTip("Jump to file")
+        layout.addWidget(self.section_combo)
         self.text_edit = QTextEdit()
         self.text_edit.setReadOnly(True)
         font = QFont('Consolas', font_size)
@@ -123,14 +380,254 @@ class MarkdownView(QWidget):
         layout.addWidget(self.text_edit)
         self.setLayout(layout)
 
+        self._titles: List[str] = []
+        self._html_sections: List[str] = []
+        self._plain_offsets: List[int] = []
+        self._positions: List[int] = []
+        self._first = 0
+        self._last = 0
+        self._loading = False
+
+        self.section_combo.activated.connect(self.jump_to_section)
+        self.text_edit.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
     def set_html_content(self, html_content: str) -> None:
         """
         Set the HTML content to be displayed in the text edit.
 
         :param html_content: The HTML string to display.
         """
+        self._set_index([])
+        self._html_sections = []
         self.text_edit.setHtml(html_content)
 
+    def set_html_sections(self, sections: List[Tuple[str, str]]) -> None:
+        """
+        Display per-file HTML sections, rendering only the first page up front.
+
+        :param sections: List of (title, html) tuples, one per file.
+        """
+        self._set_index([title for title, _ in sections])
+        self._html_sections = [html for _, html in sections]
+        self._render_window(0)
+
+    def set_plain_sections(self, sections: List[Tuple[str, str]]) -> None:
+        """
+        Display per-file plain text sections; used when the document is too large for HTML.
+
+        :param sections: List of (title, plain text) tuples, one per file.
+        """
+        self._set_index([title for title, _ in sections])
+        self._html_sections = []
+        offset = 0
+        for _, text in sections:
+            self._plain_offsets.append(offset)
+            offset += len(text)
+        self.text_edit.setPlainText(''.join(text for _, text in sections))
+
+    def jump_to_section(self, section: int) -> None:
+        """
+        Scroll to the start of a file section, rendering it first if needed.
+
+        :param section: Index of the section in the order it was set.
+        """
+        if not 0 <= section < len(self._titles):
+            return
+        self._loading = True
+        try:
+            if self._html_sections:
+                if not self._first <= section < self._last:
+                    self._render_window(section)
+                position = self._positions[section - self._first]
+            else:
+                position = self._plain_offsets[section]
+            cursor = self.text_edit.textCursor()
+            cursor.setPosition(position)
+            self.text_edit.setTextCursor(cursor)
+            # blockBoundingRect() forces the layout up to the block, so the offset is exact
+            document = self.text_edit.document()
+            block_rect = document.documentLayout().blockBoundingRect(document.findBlock(position))
+            self.text_edit.verticalScrollBar().setValue(int(block_rect.top()))
+        finally:
+            self._loading = False
+        self.section_combo.setCurrentIndex(section)
+
+    def section_of(self, title: str) -> int:
+        """
+        Return the index of the section with the given title, or -1.
+        """
+        try:
+            return self._titles.index(title)
+        except ValueError:
+            return -1
+
+    def jump_to_match(self, section: int, line: int, text: str) -> None:
+        """
+        Scroll to a file section and select an occurrence of text on or after the given line.
+
+        :param section: Index of the section.
+        :param line: 1-based line number within the file.
+        :param text: The text to select.
+        """
+        self.jump_to_section(section)
+        if not 0 <= section < len(self._titles):
+            return
+        start = self.text_edit.textCursor()
+        # The file's title takes the section's first block; line n follows n blocks later
+        target_block = start.blockNumber() + line
+        first_match = None
+        while self.text_edit.find(text):
+            cursor = self.text_edit.textCursor()
+            if first_match is None:
+                first_match = QTextCursor(cursor)
+            if cursor.blockNumber() >= target_block:
+                break
+        else:
+            if first_match is not None:
+                self.text_edit.setTextCursor(first_match)
+        self.text_edit.ensureCursorVisible()
+
+    def _set_index(self, titles: List[str]) -> None:
+        self._titles = titles
+        self._plain_offsets = []
+        self.section_combo.clear()
+        self.section_combo.addItems(titles)
+        self.section_combo.setVisible(bool(titles))
+
+    def _page_end(self, start: int) -> int:
+        """
+        Return the end (exclusive) of the page of sections starting at start.
+        """
+        end = start
+        page_bytes = 0
+        while end < len(self._html_sections) and page_bytes < self.PAGE_BYTES:
+            page_bytes += len(self._html_sections[end])
+            end += 1
+        return end
+
+    def _page_start(self, end: int) -> int:
+        """
+        Return the start of the page of sections ending (exclusive) at end.
+        """
+        start = end
+        page_bytes = 0
+        while start > 0 and page_bytes < self.PAGE_BYTES:
+            start -= 1
+            page_bytes += len(self._html_sections[start])
+        return start
+
+    def _insert_sections(self, cursor: QTextCursor, start: int, end: int) -> List[int]:
+        """
+        Insert sections [start, end) at the cursor and return their document positions.
+        """
+        positions = []
+        for i in range(start, end):
+            positions.append(cursor.position())
+            cursor.insertHtml(self._html_sections[i])
+            cursor.insertBlock()
+        return positions
+
+    def _render_window(self, first: int) -> None:
+        was_loading, self._loading = self._loading, True
+        try:
+            self.text_edit.clear()
+            self._first = first
+            self._last = self._page_end(first)
+            cursor = QTextCursor(self.text_edit.document())
+            self._positions = self._insert_sections(cursor, self._first, self._last)
+        finally:
+            self._loading = was_loading
+
+    def _on_scroll(self, value: int) -> None:
+        """
+        Render the neighbouring page when the user scrolls close to either end.
+        """
+        if self._loading or not self._html_sections:
+            return
+        scroll_bar = self.text_edit.verticalScrollBar()
+        self._loading = True
+        try:
+            document = self.text_edit.document()
+            if value >= scroll_bar.maximum() - scroll_bar.pageStep() and self._last < len(self._html_sections):
+                end = self._page_end(self._last)
+                cursor = QTextCursor(document)
+                cursor.movePosition(QTextCursor.End)
+                self._positions += self._insert_sections(cursor, self._last, end)
+                self._last = end
+                removed_height = self._drop_front()
+                if removed_height:
+                    # Keep the content that was on screen in place
+                    scroll_bar.setValue(value - removed_height)
+            elif value <= scroll_bar.pageStep() and self._first > 0:
+                start = self._page_start(self._first)
+                previous_length = document.characterCount()
+                cursor = QTextCursor(document)
+                cursor.movePosition(QTextCursor.Start)
+                positions = self._insert_sections(cursor, start, self._first)
+                shift = document.characterCount() - previous_length
+                self._positions = positions + [position + shift for position in self._positions]
+                self._first = start
+                self._drop_back()
+                # Keep the content that was on screen in place
+                scroll_bar.setValue(value + self._block_top(shift))
+        finally:
+            self._loading = False
+
+    def _surplus_sections(self, sections: Iterable[int]) -> int:
+        """
+        Return how many of the given window sections, taken in order, can be dropped
+        while keeping WINDOW_PAGES - 1 pages; none unless the window exceeds WINDOW_PAGES.
+        """
+        size = sum(len(self._html_sections[i]) for i in range(self._first, self._last))
+        if size <= self.WINDOW_PAGES * self.PAGE_BYTES:
+            return 0
+        count = 0
+        for i in sections:
+            if count >= self._last - self._first - 1 or size - len(self._html_sections[i]) < (
+                    self.WINDOW_PAGES - 1) * self.PAGE_BYTES:
+                break
+            size -= len(self._html_sections[i])
+            count += 1
+        return count
+
+    def _block_top(self, position: int) -> int:
+        """
+        Return the y offset of the block at a document position, laying out the document up to it.
+        """
+        document = self.text_edit.document()
+        return int(document.documentLayout().blockBoundingRect(document.findBlock(position)).top())
+
+    def _drop_front(self) -> int:
+        """
+        Remove the leading sections of an oversized window; return the height removed.
+        """
+        count = self._surplus_sections(range(self._first, self._last))
+        if not count:
+            return 0
+        cut = self._positions[count]
+        removed_height = self._block_top(cut)
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.setPosition(self._positions[0])
+        cursor.setPosition(cut, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self._positions = [position - cut + self._positions[0] for position in self._positions[count:]]
+        self._first += count
+        return removed_height
+
+    def _drop_back(self) -> None:
+        """
+        Remove the trailing sections of an oversized window.
+        """
+        count = self._surplus_sections(range(self._last - 1, self._first - 1, -1))
+        if not count:
+            return
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.setPosition(self._positions[-count])
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        del self._positions[-count:]
+        self._last -= count
+
     def set_font_size(self, font_size: int) -> None:
         """
         Update the font size of the text edit.
@@ -141,12 +638,96 @@ class MarkdownView(QWidget):
         font.setPointSize(font_size)
         self.text_edit.setFont(font)
 
+class SearchPanel(QWidget):
+    """
+    Find-in-selection bar: a query field and the matching lines of the checked files.
+
+    Searches run against a TrigramIndex that the render task keeps in sync with the
+    selection, a short moment after the last keystroke. Activating a hit emits
+    hit_activated with the file path, line number and query.
+    """
+    hit_activated = pyqtSignal(str, int, str)
+
+    MAX_HITS = 500
+
+    def __init__(self, index: TrigramIndex, parent=None):
+        super().__init__(parent)
+        self.index = index
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Find in selection")
+        self.query_edit.setClearButtonEnabled(True)
+        layout.addWidget(self.query_edit)
+        self.results_list = QListWidget()
+        self.results_list.setMaximumHeight(180)
+        self.results_list.setVisible(False)
+        layout.addWidget(self.results_list)
+        self.setLayout(layout)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(150)
+        self._timer.timeout.connect(self.run_search)
+        self.query_edit.textChanged.connect(self._timer.start)
+        self.query_edit.returnPressed.connect(self._activate_first)
+        self.results_list.itemActivated.connect(self._on_item_activated)
+        self.results_list.itemClicked.connect(self._on_item_activated)
+
+    def run_search(self) -> None:
+        """
+        Search the index for the current query and list the hits.
+        """
+        self._timer.stop()
+        query = self.query_edit.text()
+        self.results_list.clear()
+        if not query.strip():
+            self.results_list.setVisible(False)
+            return
+        start = time.perf_counter()
+        hits = self.index.search(query, self.MAX_HITS)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for file_path, line, snippet in hits:
+            item = QListWidgetItem(f"{display_path(file_path)}:{line}  {snippet}")
+            item.setData(Qt.UserRole, (file_path, line))
+            self.results_list.addItem(item)
+        self.results_list.setVisible(True)
+        more = "+" if len(hits) >= self.MAX_HITS else ""
+        self.query_edit.setToolTip(f"{len(hits)}{more} hits in {len(self.index)} files ({elapsed_ms:.1f} ms)")
+        logging.debug(f"Search {query!r}: {len(hits)} hits in {elapsed_ms:.1f} ms")
+
+    def refresh(self) -> None:
+        """
+        Re-run the current search, e.g. after the selection changed.
+        """
+        if self.query_edit.text().strip():
+            self.run_search()
+
+    def focus_query(self) -> None:
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
+
+    def _activate_first(self) -> None:
+        if self._timer.isActive():
+            self.run_search()
+        if self.results_list.count():
+            self._on_item_activated(self.results_list.item(0))
+
+    def _on_item_activated(self, item: QListWidgetItem) -> None:
+        file_path, line = item.data(Qt.UserRole)
+        self.hit_activated.emit(file_path, line, self.query_edit.text())
+
 class SettingsDialog(QDialog):
-    def __init__(self, parent=None, current_font_size=12, current_theme='Light', current_extensions=None):
+    def __init__(self, parent=None, current_font_size=12, current_theme='Light', current_extensions=None,
+                 current_update_delay=150, current_expand_depth=0, current_read_workers=4,
+                 current_max_file_kb=DEFAULT_MAX_FILE_BYTES // 1024, current_budget_enabled=False,
+                 current_budget_limit=100000, current_budget_unit='tokens', current_budget_order='selection',
+                 current_use_gitignore=True, current_max_watched_files=4096, current_log_level='ERROR',
+                 current_dedup=False):
         super().__init__(parent)
         self.setWindowTitle("Settings")
         self.setModal(True)
-        self.resize(400, 250)
+        self.resize(480, 400)
 
         layout = QVBoxLayout()
 
@@ -178,6 +759,103 @@ class SettingsDialog(QDialog):
         extensions_layout.addWidget(self.extensions_edit)
         layout.addLayout(extensions_layout)
 
+        # Update Delay
+        delay_layout = QHBoxLayout()
+        delay_label = QLabel("Update Delay (ms):")
+        self.delay_spin = QSpinBox()
+        self.delay_spin.setRange(0, 5000)
+        self.delay_spin.setSingleStep(50)
+        self.delay_spin.setValue(current_update_delay)
+        delay_layout.addWidget(delay_label)
+        delay_layout.addWidget(self.delay_spin)
+        layout.addLayout(delay_layout)
+
+        # Startup Expand Depth
+        depth_layout = QHBoxLayout()
+        depth_label = QLabel("Startup Expand Depth (0 = collapsed):")
+        self.depth_spin = QSpinBox()
+        self.depth_spin.setRange(0, 16)
+        self.depth_spin.setValue(current_expand_depth)
+        depth_layout.addWidget(depth_label)
+        depth_layout.addWidget(self.depth_spin)
+        layout.addLayout(depth_layout)
+
+        # Parallel File Reads
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("Parallel File Reads:")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 64)
+        self.workers_spin.setValue(current_read_workers)
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_spin)
+        layout.addLayout(workers_layout)
+
+        # Max File Size
+        max_size_layout = QHBoxLayout()
+        max_size_label = QLabel("Max File Size (KB, 0 = unlimited):")
+        self.max_size_spin = QSpinBox()
+        self.max_size_spin.setRange(0, 1024 * 1024)
+        self.max_size_spin.setSingleStep(256)
+        self.max_size_spin.setValue(current_max_file_kb)
+        max_size_layout.addWidget(max_size_label)
+        max_size_layout.addWidget(self.max_size_spin)
+        layout.addLayout(max_size_layout)
+
+        # Budget Mode
+        budget_layout = QHBoxLayout()
+        self.budget_check = QCheckBox("Budget Mode:")
+        self.budget_check.setToolTip("Pack the preview and copied content into a fixed size")
+        self.budget_check.setChecked(current_budget_enabled)
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(1, 2 ** 31 - 1)
+        self.budget_spin.setSingleStep(1000)
+        self.budget_spin.setValue(current_budget_limit)
+        self.budget_unit_combo = QComboBox()
+        self.budget_unit_combo.addItems(BUDGET_UNITS)
+        self.budget_unit_combo.setCurrentText(current_budget_unit)
+        self.budget_order_combo = QComboBox()
+        self.budget_order_combo.addItems(BUDGET_ORDERS)
+        self.budget_order_combo.setCurrentText(current_budget_order)
+        self.budget_order_combo.setToolTip("Files kept first when the budget is exceeded")
+        budget_layout.addWidget(self.budget_check)
+        budget_layout.addWidget(self.budget_spin)
+        budget_layout.addWidget(self.budget_unit_combo)
+        budget_layout.addWidget(self.budget_order_combo)
+        layout.addLayout(budget_layout)
+
+        # .gitignore
+        self.gitignore_check = QCheckBox("Respect .gitignore")
+        self.gitignore_check.setToolTip("Hide files and folders excluded by .gitignore files under the root")
+        self.gitignore_check.setChecked(current_use_gitignore)
+        layout.addWidget(self.gitignore_check)
+
+        # Deduplication
+        self.dedup_check = QCheckBox("Collapse identical files")
+        self.dedup_check.setToolTip("Show later copies of a file as a reference to the first copy")
+        self.dedup_check.setChecked(current_dedup)
+        layout.addWidget(self.dedup_check)
+
+        # Live Refresh
+        watch_layout = QHBoxLayout()
+        watch_label = QLabel("Watch Checked Files (max, 0 = off):")
+        self.watch_spin = QSpinBox()
+        self.watch_spin.setRange(0, 65536)
+        self.watch_spin.setSingleStep(512)
+        self.watch_spin.setValue(current_max_watched_files)
+        watch_layout.addWidget(watch_label)
+        watch_layout.addWidget(self.watch_spin)
+        layout.addLayout(watch_layout)
+
+        # Log Level
+        log_layout = QHBoxLayout()
+        log_label = QLabel("Log Level (rebuild timings at INFO):")
+        self.log_level_combo = QComboBox()
+        self.log_level_combo.addItems(LOG_LEVELS)
+        self.log_level_combo.setCurrentText(current_log_level)
+        log_layout.addWidget(log_label)
+        log_layout.addWidget(self.log_level_combo)
+        layout.addLayout(log_layout)
+
         # Buttons
         buttons_layout = QHBoxLayout()
         self.save_button = QPushButton("Save")
@@ -197,9 +875,341 @@ class SettingsDialog(QDialog):
         return {
             'font_size': self.font_spin.value(),
             'theme': self.theme_combo.currentText(),
-            'file_extensions': [ext.strip() for ext in self.extensions_edit.text().split(",") if ext.strip()]
+            'file_extensions': [ext.strip() for ext in self.extensions_edit.text().split(",") if ext.strip()],
+            'update_delay_ms': self.delay_spin.value(),
+            'startup_expand_depth': self.depth_spin.value(),
+            'read_workers': self.workers_spin.value(),
+            'max_file_kb': self.max_size_spin.value(),
+            'budget_enabled': self.budget_check.isChecked(),
+            'budget_limit': self.budget_spin.value(),
+            'budget_unit': self.budget_unit_combo.currentText(),
+            'budget_order': self.budget_order_combo.currentText(),
+            'use_gitignore': self.gitignore_check.isChecked(),
+            'max_watched_files': self.watch_spin.value(),
+            'log_level': self.log_level_combo.currentText(),
+            'dedup': self.dedup_check.isChecked()
         }
 
+# ----------------------------
+# Workers
+# ----------------------------
+
+class UpdateScheduler(QObject):
+    """
+    Coalesces bursts of change notifications into a single rebuild.
+
+    Every call to schedule() restarts a single-shot timer; triggered is emitted once
+    the changes have been quiet for delay_ms milliseconds.
+    """
+    triggered = pyqtSignal()
+
+    def __init__(self, delay_ms: int = 150, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.requests = 0
+        self.rebuilds = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._fire)
+        self.set_delay(delay_ms)
+
+    @property
+    def delay_ms(self) -> int:
+        return self._timer.interval()
+
+    @property
+    def skipped(self) -> int:
+        """
+        Number of requests that were folded into another rebuild.
+        """
+        return self.requests - self.rebuilds - (1 if self._timer.isActive() else 0)
+
+    def set_delay(self, delay_ms: int) -> None:
+        self._timer.setInterval(max(0, delay_ms))
+
+    def schedule(self) -> None:
+        """
+        Request a rebuild after the quiet period.
+        """
+        self.requests += 1
+        self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Run a pending rebuild immediately.
+        """
+        if self._timer.isActive():
+            self._timer.stop()
+            self._fire()
+
+    def _fire(self) -> None:
+        self.rebuilds += 1
+        logging.debug(f"Rebuild {self.rebuilds}: {self.requests} requests, {self.skipped} skipped")
+        self.triggered.emit()
+
+class SelectionWatcher(QObject):
+    """
+    Watches the checked files on disk and reports which of them changed.
+
+    Change notifications are collected until events have been quiet for delay_ms, or
+    for at most max_wait_ms after the first one, so a git checkout or a formatter run
+    produces a single files_changed. At most max_files files are watched, because
+    every watch costs a kernel handle (an inotify watch on Linux).
+    """
+    files_changed = pyqtSignal(list)
+
+    def __init__(self, max_files: int = 4096, delay_ms: int = 300, max_wait_ms: int = 2000,
+                 parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.max_files = max_files
+        self.delay_ms = delay_ms
+        self.max_wait_ms = max_wait_ms
+        self.unwatched = 0
+        self._watched: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._first_event = 0.0
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._flush)
+
+    def sync(self, file_paths: List[str]) -> None:
+        """
+        Watch exactly the given files, up to max_files of them.
+
+        :param file_paths: Checked files, most important first.
+        """
+        wanted = set(file_paths[:self.max_files])
+        self.unwatched = len(file_paths) - len(wanted)
+        removed = list(self._watched - wanted)
+        added = list(wanted - self._watched)
+        if removed:
+            self._watcher.removePaths(removed)
+        if added:
+            failed = self._watcher.addPaths(added)
+            wanted.difference_update(failed)
+        self._watched = wanted
+        self._pending.intersection_update(wanted)
+
+    def _on_file_changed(self, file_path: str) -> None:
+        now = time.monotonic()
+        if not self._pending:
+            self._first_event = now
+        self._pending.add(file_path)
+        remaining_ms = self.max_wait_ms - (now - self._first_event) * 1000
+        # Not the timer's interval: start(ms) overwrites it with the shortened wait
+        self._timer.start(int(max(0, min(self.delay_ms, remaining_ms))))
+
+    def _flush(self) -> None:
+        changed = sorted(self._pending)
+        self._pending.clear()
+        # Editors that save by renaming replace the file, which drops its watch
+        lost = [path for path in changed if path in self._watched and os.path.exists(path)]
+        watching = set(self._watcher.files())
+        lost = [path for path in lost if path not in watching]
+        if lost:
+            self._watcher.addPaths(lost)
+        if changed:
+            self.files_changed.emit(changed)
+
+
+class FolderScanSignals(QObject):
+    """
+    Signals emitted by FolderScanTask.
+    """
+    # generation, directory, [(path, size)]
+    finished = pyqtSignal(int, str, list)
+
+
+class FolderScanTask(QRunnable):
+    """
+    Walks a folder with the model's filters off the GUI thread.
+
+    The generation is the model's scan generation when the walk started; the model
+    discards results from before a filter change.
+    """
+
+    def __init__(self, generation: int, directory: str, scan: Callable[[str], Iterable[Tuple[str, int]]]) -> None:
+        super().__init__()
+        self.generation = generation
+        self.directory = directory
+        self.scan = scan
+        self.signals = FolderScanSignals()
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """
+        Ask the task to stop walking; no result will be emitted.
+        """
+        self._cancelled = True
+
+    def run(self) -> None:
+        files = []
+        try:
+            for entry in self.scan(self.directory):
+                if self._cancelled:
+                    return
+                files.append(entry)
+        except Exception as e:
+            logging.error(f"Error scanning directory {self.directory}: {e}")
+            return
+        if not self._cancelled:
+            self.signals.finished.emit(self.generation, self.directory, files)
+
+
+class RenderSignals(QObject):
+    """
+    Signals emitted by RenderTask; a QRunnable cannot emit signals itself.
+    """
+    # generation, markdown content, plain text content, [(title, section)], sections are html, size summary
+    finished = pyqtSignal(int, str, str, list, bool, dict)
+    # generation, error message
+    failed = pyqtSignal(int, str)
+
+
+class RenderTask(QRunnable):
+    """
+    Reads the checked files and renders the markdown preview off the GUI thread.
+
+    Each file is rendered to its own HTML section so the preview can be virtualized.
+    Documents larger than plain_text_threshold bytes skip HTML rendering entirely and
+    are emitted as plain text sections.
+
+    With a budget, the output is packed into the budget's limit; the meter keeps the
+    running size of the whole selection either way.
+    With dedup, files identical to an earlier one are shown as a reference to it.
+    A search_index is synced with the contents of the files shown.
+
+    Each task carries the generation number of the update that created it, so the
+    window can discard results that were superseded by a newer selection change.
+
+    Stage timings and counters are collected in stats and returned in the summary
+    under 'stats'. With profile set, the run is recorded with cProfile and the
+    report is returned under 'profile'.
+    """
+
+    def __init__(self, generation: int, file_paths: List[str], cache: Optional[FileContentCache] = None,
+                 plain_text_threshold: int = 20 * 1024 * 1024, render_cache: Optional[RenderCache] = None,
+                 workers: int = 1, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                 budget: Optional[Budget] = None, meter: Optional[BudgetMeter] = None,
+                 stats: Optional[PipelineStats] = None, profile: bool = False, dedup: bool = False,
+                 search_index: Optional[TrigramIndex] = None) -> None:
+        super().__init__()
+        self.generation = generation
+        self.file_paths = file_paths
+        self.cache = cache
+        self.render_cache = render_cache
+        self.workers = workers
+        self.max_file_bytes = max_file_bytes
+        self.budget = budget
+        self.meter = meter
+        self.plain_text_threshold = plain_text_threshold
+        self.stats = stats if stats is not None else PipelineStats()
+        self.profile = profile
+        self.dedup = dedup
+        self.search_index = search_index
+        self.signals = RenderSignals()
+        self._cancelled = False
+        self._error = ""
+
+    def cancel(self) -> None:
+        """
+        Ask the task to stop at the next file boundary; no result will be emitted.
+        """
+        self._cancelled = True
+
+    def run(self) -> None:
+        profiler = cProfile.Profile() if self.profile else None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            result = self._run()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        if self._cancelled:
+            return
+        if result is None:
+            self.signals.failed.emit(self.generation, self._error)
+            return
+        if profiler is not None:
+            result[-1]['profile'] = self._profile_report(profiler)
+        self.signals.finished.emit(self.generation, *result)
+
+    @staticmethod
+    def _profile_report(profiler: cProfile.Profile) -> Dict[str, str]:
+        """
+        Save the profile to a temporary .prof file and format its top entries.
+        """
+        fd, path = tempfile.mkstemp(prefix='concatenator-rebuild-', suffix='.prof')
+        os.close(fd)
+        profiler.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(30)
+        return {'path': path, 'text': report.getvalue()}
+
+    def _run(self) -> Optional[Tuple[str, str, List[Tuple[str, str]], bool, Dict[str, Any]]]:
+        stats = self.stats
+        try:
+            file_paths = self.budget.order_files(self.file_paths) if self.budget is not None else self.file_paths
+            chunks = []
+            with stats.timer('collect'):
+                for file_chunks in iter_file_chunks(file_paths, self.cache, self.workers, self.max_file_bytes, stats,
+                                                    self.dedup):
+                    if self._cancelled:
+                        return None
+                    chunks.append(file_chunks)
+            build_start = time.perf_counter()
+            markdown_entries = [(file_path, markdown_chunk) for file_path, markdown_chunk, _ in chunks]
+            plain_entries = [(file_path, plain_chunk) for file_path, _, plain_chunk in chunks]
+            summary = {}
+            if self.meter is not None:
+                summary['total'] = self.meter.update(markdown_entries)
+                summary['unit'] = self.meter.unit
+            if self.budget is not None:
+                markdown_entries = list(self.budget.pack(markdown_entries, 'markdown'))
+                summary.update(limit=self.budget.limit, unit=self.budget.unit, used=self.budget.used,
+                               trimmed=self.budget.trimmed, omitted=len(chunks) - self.budget.included)
+                plain_entries = list(self.budget.pack(plain_entries, 'plain'))
+            markdown_content = ''.join(markdown_chunk for _, markdown_chunk in markdown_entries)
+            plain_text_content = ''.join(plain_chunk for _, plain_chunk in plain_entries)
+            is_html = len(plain_text_content) <= self.plain_text_threshold
+            stats.add_time('build', time.perf_counter() - build_start)
+            stats.count('output_bytes', len(markdown_content))
+            if self.search_index is not None:
+                # Index what is shown, without the path line that heads each plain text chunk
+                with stats.timer('search_index'):
+                    reindexed = self.search_index.sync((file_path, plain_chunk.split('\n', 1)[-1])
+                                                       for file_path, plain_chunk in plain_entries)
+                stats.count('search_reindexed', reindexed)
+            converter = new_markdown_converter()
+            sections = []
+            converted_before = self.render_cache.misses if self.render_cache is not None else 0
+            with stats.timer('convert'):
+                for file_path, chunk in (markdown_entries if is_html else plain_entries):
+                    if self._cancelled:
+                        return None
+                    title = display_path(file_path)
+                    if is_html:
+                        sections.append((title, render_markdown_chunk(chunk, self.render_cache, converter)))
+                    else:
+                        sections.append((title, chunk))
+            if is_html:
+                converted = (self.render_cache.misses - converted_before if self.render_cache is not None
+                             else len(sections))
+                stats.count('html_converted', converted)
+            # Persist what this rebuild read and rendered
+            index = self.cache.index if self.cache is not None else None
+            if index is not None:
+                with stats.timer('index'):
+                    index.commit()
+        except Exception as e:
+            logging.error(f"Error rendering content: {e}")
+            self._error = str(e)
+            return None
+        summary['stats'] = stats
+        return markdown_content, plain_text_content, sections, is_html, summary
+
 # ----------------------------
 # Views (continued)
 # ----------------------------
@@ -289,8 +1299,43 @@ class MainWindow(QMainWindow):
         self.settings = settings
         self.font_size = self.settings.value('font_size', 12, type=int)
         self.theme = self.settings.value('theme', 'Light', type=str)
-        self.extensions = self.settings.value('file_extensions', ['*.py', '*.js'], type=list)
-        self.hidden_dirs = self.settings.value('hidden_directories', ['__pycache__', '.git'], type=list)
+        self.extensions = self.settings.value('file_extensions', DEFAULT_EXTENSIONS, type=list)
+        self.hidden_dirs = self.settings.value('hidden_directories', DEFAULT_HIDDEN_DIRS, type=list)
+        register_languages(self.settings.value('language_map', [], type=list))
+
+        self.update_delay = self.settings.value('update_delay_ms', 150, type=int)
+        self.expand_depth = self.settings.value('startup_expand_depth', 0, type=int)
+        self.read_workers = self.settings.value('read_workers', 4, type=int)
+        self.max_file_kb = self.settings.value('max_file_kb', DEFAULT_MAX_FILE_BYTES // 1024, type=int)
+        self.budget_enabled = self.settings.value('budget_enabled', False, type=bool)
+        self.budget_limit = self.settings.value('budget_limit', 100000, type=int)
+        self.budget_unit = self.settings.value('budget_unit', 'tokens', type=str)
+        self.budget_order = self.settings.value('budget_order', 'selection', type=str)
+        self.preview_plain_text_mb = self.settings.value('preview_plain_text_mb', 20, type=int)
+        self.use_gitignore = self.settings.value('use_gitignore', True, type=bool)
+        self.max_watched_files = self.settings.value('max_watched_files', 4096, type=int)
+        self.log_level = self.settings.value('log_level', 'ERROR', type=str)
+        self.dedup = self.settings.value('dedup', False, type=bool)
+        logging.getLogger().setLevel(self.log_level)
+
+        # Selections and rendered chunks persisted across restarts
+        self.index = self._open_index()
+
+        # Per-file chunk cache shared by all rebuilds
+        cache_mb = self.settings.value('content_cache_mb', 64, type=int)
+        self.content_cache = FileContentCache(max_bytes=cache_mb * 1024 * 1024, index=self.index)
+        self.render_cache = RenderCache(max_bytes=cache_mb * 1024 * 1024, index=self.index)
+
+        # Rendering happens on a single background thread; newer updates supersede older ones
+        self.markdown_content = ''
+        self.plain_text_content = ''
+        self.render_pool = QThreadPool(self)
+        self.render_pool.setMaxThreadCount(1)
+        self._render_generation = 0
+        self._render_task: Optional[RenderTask] = None
+        self._render_started = 0.0
+        self._profile_next = False
+        self.budget_meter = BudgetMeter(self.budget_unit)
 
         # Create actions
         self.create_actions()
@@ -300,18 +1345,17 @@ class MainWindow(QMainWindow):
 
         # File system model
         self.model = CheckableFileSystemModel(self.extensions)
-        self.model.setRootPath(QDir.currentPath())
+        self.model.hidden_dirs = self.hidden_dirs
 
         # Proxy model for filtering directories
         self.proxy_model = DirectoryFilterProxyModel(hidden_dirs=self.hidden_dirs)
         self.proxy_model.setSourceModel(self.model)
 
-        # Directory tree view
+        # Directory tree view, showing the roots of the workspace below their common folder
         self.tree = QTreeView()
         self.tree.setModel(self.proxy_model)
-        root_index = self.model.index(QDir.currentPath())
-        proxy_root_index = self.proxy_model.mapFromSource(root_index)
-        self.tree.setRootIndex(proxy_root_index)
+        self.workspace = Workspace([QDir.currentPath()])
+        self._apply_workspace(self.workspace)
         self.tree.setSelectionMode(QAbstractItemView.NoSelection)
         self.tree.hideColumn(1)
         self.tree.hideColumn(2)
@@ -319,12 +1363,25 @@ class MainWindow(QMainWindow):
         self.tree.setHeaderHidden(True)
         splitter.addWidget(self.tree)
 
-        # Expand the tree view on application start
-        self.tree.expandAll()
+        # Expand the tree view on application start down to the saved depth (collapsed by default).
+        # Directories are fetched asynchronously, so they are expanded as they finish loading.
+        self._startup_expanded: Set[str] = set()
+        self.model.directoryLoaded.connect(self._expand_loaded_directory)
+
+        # Find-in-selection bar above the views, backed by an index of the checked files
+        self.search_index = TrigramIndex()
+        self.search_panel = SearchPanel(self.search_index)
+        self.search_panel.hit_activated.connect(self.on_search_hit)
 
         # Tab widget for multiple views
         self.tab_widget = QTabWidget()
-        splitter.addWidget(self.tab_widget)
+        right_panel = QWidget()
+        right_layout = QVBoxLayout()
+        right_layout.setContentsMargins(0, 0, 0, 0)
+        right_layout.addWidget(self.search_panel)
+        right_layout.addWidget(self.tab_widget)
+        right_panel.setLayout(right_layout)
+        splitter.addWidget(right_panel)
 
         # Markdown view as first tab
         self.markdown_view = MarkdownView(font_size=self.font_size)
@@ -341,14 +1398,73 @@ class MainWindow(QMainWindow):
         # Menu Bar
         self.create_menu()
 
+        # Status Bar
+        self.stats_label = QLabel()
+        self.statusBar().addPermanentWidget(self.stats_label)
+        self.size_label = QLabel()
+        self.statusBar().addPermanentWidget(self.size_label)
+
         # Apply theme
         self.apply_theme()
 
         # Signal connections
-        self.model.dataChanged.connect(self.update_text)
+        self.update_scheduler = UpdateScheduler(self.update_delay, self)
+        self.update_scheduler.triggered.connect(self.update_text)
+        self.model.checked_files_changed.connect(self.update_scheduler.schedule)
+
+        # Live refresh of checked files edited on disk
+        self.file_watcher = SelectionWatcher(self.max_watched_files, parent=self)
+        self.file_watcher.files_changed.connect(self.on_watched_files_changed)
+
+        # Restore the files checked the last time this root was open
+        self._restore_selection()
 
         self.showMaximized()
 
+    def _data_directory(self) -> str:
+        """
+        Return the directory for the index and other data kept between sessions.
+        """
+        if self.settings.format() == QSettings.NativeFormat and sys.platform == 'win32':
+            return QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        return os.path.dirname(self.settings.fileName())
+
+    def _open_index(self) -> Optional[PersistentIndex]:
+        """
+        Open the persistent index next to the settings file, unless disabled.
+        """
+        if not self.settings.value('persistent_index', True, type=bool):
+            return None
+        index_path = self.settings.value('index_path', '', type=str)
+        if not index_path:
+            index_path = os.path.join(self._data_directory(), 'index.sqlite3')
+        max_mb = self.settings.value('index_max_mb', 256, type=int)
+        try:
+            return PersistentIndex(index_path, max_mb * 1024 * 1024)
+        except Exception as e:
+            logging.error(f"Error opening index {index_path}: {e}")
+            return None
+
+    def _restore_selection(self) -> None:
+        """
+        Check the files saved for the current workspace roots that still exist.
+        """
+        if self.index is not None:
+            file_paths = [path for path in self.index.load_selection(self.workspace.key) if os.path.isfile(path)]
+            self.model.set_checked_many(file_paths, Qt.Checked)
+        self.model.scan_selected_folders(self.workspace.roots)
+
+    def _save_selection(self) -> None:
+        """
+        Save the checked files of the current workspace roots, in selection order.
+        """
+        if self.index is None:
+            return
+        try:
+            self.index.save_selection(self.workspace.key, self.model.get_checked_files_in_selection_order())
+        except Exception as e:
+            logging.error(f"Error saving selection: {e}")
+
     def create_actions(self) -> None:
         """
         Create all QAction instances used in the application.
@@ -358,11 +1474,33 @@ class MainWindow(QMainWindow):
         self.change_root_action.setStatusTip("Change the root directory")
         self.change_root_action.triggered.connect(self.change_root_directory)
 
+        self.add_root_action = QAction(QIcon.fromTheme("folder-new"), "Add Root Directory...", self)
+        self.add_root_action.setStatusTip("Open another root directory alongside the current ones")
+        self.add_root_action.triggered.connect(self.add_root_directory)
+
+        self.remove_root_action = QAction("Remove Root Directory...", self)
+        self.remove_root_action.setStatusTip("Close one of the open root directories")
+        self.remove_root_action.triggered.connect(self.remove_root_directory)
+
         # Save Action
         self.save_action = QAction(QIcon.fromTheme("document-save"), "Save", self)
         self.save_action.setStatusTip("Save concatenated content to file")
         self.save_action.triggered.connect(self.save_content)
 
+        # Save Changes Actions
+        self.save_changes_action = QAction("Save Changes Since Last Export...", self)
+        self.save_changes_action.setStatusTip("Save only the checked files changed since the last save")
+        self.save_changes_action.triggered.connect(lambda: self.save_changes())
+
+        self.save_changes_ref_action = QAction("Save Changes Since Git Revision...", self)
+        self.save_changes_ref_action.setStatusTip("Save only the checked files that differ from a git revision")
+        self.save_changes_ref_action.triggered.connect(lambda: self.save_changes(since_ref=True))
+
+        # Export Shards Action
+        self.export_shards_action = QAction("Export Shards...", self)
+        self.export_shards_action.setStatusTip("Save concatenated content split into size-limited shards")
+        self.export_shards_action.triggered.connect(self.export_shards)
+
         # Clear Action
         self.clear_action = QAction(QIcon.fromTheme("edit-clear"), "Clear Selection", self)
         self.clear_action.setStatusTip("Deselect all files")
@@ -393,6 +1531,17 @@ class MainWindow(QMainWindow):
         self.settings_action.setStatusTip("Configure application settings")
         self.settings_action.triggered.connect(self.open_settings_dialog)
 
+        # Profile Action
+        self.profile_action = QAction("Profile Next Rebuild", self)
+        self.profile_action.setStatusTip("Rebuild the preview under cProfile and show where the time went")
+        self.profile_action.triggered.connect(self.profile_next_rebuild)
+
+        # Find Action
+        self.find_action = QAction(QIcon.fromTheme("edit-find"), "Find in Selection", self)
+        self.find_action.setShortcut(QKeySequence.Find)
+        self.find_action.setStatusTip("Search the contents of the checked files")
+        self.find_action.triggered.connect(lambda: self.search_panel.focus_query())
+
         # About Action
         self.about_action = QAction("About", self)
         self.about_action.setStatusTip("About this application")
@@ -421,8 +1570,13 @@ class MainWindow(QMainWindow):
         file_menu = menubar.addMenu("File")
 
         file_menu.addAction(self.change_root_action)
+        file_menu.addAction(self.add_root_action)
+        file_menu.addAction(self.remove_root_action)
         file_menu.addSeparator()
         file_menu.addAction(self.save_action)
+        file_menu.addAction(self.save_changes_action)
+        file_menu.addAction(self.save_changes_ref_action)
+        file_menu.addAction(self.export_shards_action)
         file_menu.addSeparator()
         file_menu.addAction(self.exit_action)
 
@@ -431,12 +1585,15 @@ class MainWindow(QMainWindow):
         edit_menu.addAction(self.select_all_action)
         edit_menu.addAction(self.clear_action)
         edit_menu.addSeparator()
+        edit_menu.addAction(self.find_action)
+        edit_menu.addSeparator()
         edit_menu.addAction(self.copy_md_action)
         edit_menu.addAction(self.copy_text_action)
 
         # View Menu
         view_menu = menubar.addMenu("View")
         view_menu.addAction(self.settings_action)
+        view_menu.addAction(self.profile_action)
 
         # Help Menu
         help_menu = menubar.addMenu("Help")
@@ -452,44 +1609,57 @@ class MainWindow(QMainWindow):
     def clear_selection(self) -> None:
         """
         Deselects all files by unchecking them.
-        Before performing the operation, expand all tree nodes to ensure all files are accessible.
         """
-        self.tree.expandAll()
-        for file_path in list(self.model.checked_files):
-            index = self.model.index(file_path)
-            if index.isValid():
-                self.model.setData(index, Qt.Unchecked, Qt.CheckStateRole)
+        self.model.set_checked_many(list(self.model.checked_files), Qt.Unchecked)
 
     def select_all(self) -> None:
         """
-        Selects (checks) all eligible files in the model, including those in collapsed folders.
-        Before performing the operation, expand all tree nodes to ensure all files are accessible.
+        Selects (checks) all eligible files under the root, including those in collapsed folders.
         """
-        self.tree.expandAll()
-        # Retrieve the root index from the source model to ensure all directories are traversed
         root_path = self.model.rootPath()
         root_index = self.model.index(root_path)
         self._traverse_and_set(root_index, Qt.Checked)
 
     def _traverse_and_set(self, parent_index: QModelIndex, check_state: Qt.CheckState) -> None:
         """
-        Recursively traverses the model and sets the check state for each file.
-        This method ensures that all files are selected, regardless of their visibility in the view.
+        Sets the check state of every eligible file below a directory.
+
+        The directory is walked on disk rather than through the model, so folders the
+        model has not fetched yet are included and the view does not have to expand.
+        It is always walked again, so files created since the last walk are picked up.
 
-        :param parent_index: The parent index to start traversal.
+        :param parent_index: Index of the directory to start traversal.
         :param check_state: The check state to set (Qt.Checked or Qt.Unchecked).
         """
+        self.model.set_directory_checked(self.model.filePath(parent_index), check_state, rescan=True)
+
+    def _expand_loaded_directory(self, directory: str) -> None:
+        """
+        Expand the subfolders of a freshly loaded directory that lie within the startup
+        expand depth. Expanding them makes the model fetch them, which in turn calls
+        this method again one level deeper.
+
+        :param directory: Path of the directory the model finished loading.
+        """
+        if directory in self._startup_expanded:
+            return
+        # Depth counts from each workspace root; the folders leading to the roots are depth 0
+        root = self.workspace.root_of(directory)
+        if root is not None:
+            rel_path = os.path.relpath(directory, root)
+            depth = 0 if rel_path == os.curdir else rel_path.count(os.sep) + 1
+        elif self.workspace.is_ancestor(directory):
+            depth = 0
+        else:
+            return
+        if depth >= self.expand_depth:
+            return
+        self._startup_expanded.add(directory)
+        parent_index = self.model.index(directory)
         for row in range(self.model.rowCount(parent_index)):
             index = self.model.index(row, 0, parent_index)
-            if not index.isValid():
-                continue
-
             if self.model.isDir(index):
-                # If it's a directory, traverse its children
-                self._traverse_and_set(index, check_state)
-            else:
-                # If it's a file, set its check state
-                self.model.setData(index, check_state, Qt.CheckStateRole)
+                self.tree.expand(self.proxy_model.mapFromSource(index))
 
     def copy_markdown(self) -> None:
         """
@@ -509,39 +1679,253 @@ class MainWindow(QMainWindow):
 
     def save_content(self) -> None:
         """
-        Save the concatenated content to a file.
+        Save the concatenated content to a file, and record it as the last export.
+        """
+        target = self._ask_output_file("Save Concatenated Content")
+        if target is None:
+            return
+        file_name, fmt = target
+        file_paths = self.model.get_checked_files()
+        # Filled while writing; the baseline of the next Save Changes
+        snapshot: Dict[str, Any] = {}
+
+        def write(f: TextIO, report_progress: Callable[[int, int], bool]) -> bool:
+            return write_concatenated(file_paths, f, fmt, self.content_cache, report_progress,
+                                      workers=self.read_workers, max_file_bytes=self.max_file_kb * 1024,
+                                      dedup=self.dedup, snapshot=snapshot)
+
+        if self._write_export(file_name, "Saving concatenated content...", len(file_paths), write):
+            self._save_export_snapshot(snapshot)
+            QMessageBox.information(self, "Saved", f"Content saved to {file_name}.")
+
+    def save_changes(self, since_ref: bool = False) -> None:
+        """
+        Save only the checked files that changed since the last export, or since a git ref.
+
+        :param since_ref: Compare with a git ref asked from the user instead of the last export.
+        """
+        file_paths = self.model.get_checked_files()
+        try:
+            if since_ref:
+                ref, ok = QInputDialog.getText(self, "Save Changes", "Git revision:",
+                                               text=self.settings.value('delta_git_ref', 'HEAD', type=str))
+                if not ok or not ref.strip():
+                    return
+                self.settings.setValue('delta_git_ref', ref.strip())
+                delta = delta_since_git_ref(file_paths, ref.strip(), self.model.name_matcher, self.hidden_dirs,
+                                            self.model.ignore_matcher, self.workspace.roots)
+                snapshot = None
+            else:
+                result = delta_since_snapshot(file_paths, load_export_snapshot(self._export_snapshot_path()),
+                                              self.content_cache, self.read_workers, self.max_file_kb * 1024)
+                if result is None:
+                    return
+                delta, snapshot = result
+        except Exception as e:
+            logging.error(f"Error comparing the selection: {e}")
+            QMessageBox.critical(self, "Save Error", f"Could not compare the selection: {e}")
+            return
+        if not delta:
+            QMessageBox.information(self, "No Changes", f"No changes: {delta.summary()}.")
+            return
+
+        target = self._ask_output_file(f"Save Changes ({delta.summary()})")
+        if target is None:
+            return
+        file_name, fmt = target
+
+        def write(f: TextIO, report_progress: Callable[[int, int], bool]) -> bool:
+            return write_delta(delta, f, fmt, self.content_cache, report_progress, self.read_workers,
+                               self.max_file_kb * 1024)
+
+        if self._write_export(file_name, "Saving changes...", len(delta.added) + len(delta.modified), write):
+            if snapshot is not None:
+                self._save_export_snapshot(snapshot)
+            QMessageBox.information(self, "Saved", f"Changes saved to {file_name}: {delta.summary()}.")
+
+    def _ask_output_file(self, caption: str) -> Optional[Tuple[str, str]]:
+        """
+        Ask for an output file; return its name and format, or None if cancelled.
         """
         options = QFileDialog.Options()
         file_name, selected_filter = QFileDialog.getSaveFileName(
             self,
-            "Save Concatenated Content",
+            caption,
             "",
             "Markdown Files (*.md);;Text Files (*.txt);;All Files (*)",
             options=options
         )
-        if file_name:
-            try:
-                if file_name.endswith('.md') or selected_filter == "Markdown Files (*.md)":
-                    content_to_save = self.markdown_content
-                else:
-                    content_to_save = self.plain_text_content
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    f.write(content_to_save)
-                QMessageBox.information(self, "Saved", f"Content saved to {file_name}.")
-            except Exception as e:
-                logging.error(f"Error saving file {file_name}: {e}")
-                QMessageBox.critical(self, "Save Error", f"Could not save file: {e}")
+        if not file_name:
+            return None
+        if file_name.endswith('.md') or selected_filter == "Markdown Files (*.md)":
+            return file_name, 'markdown'
+        return file_name, 'plain'
+
+    def _write_export(self, file_name: str, label: str, total: int,
+                      write: Callable[[TextIO, Callable[[int, int], bool]], bool]) -> bool:
+        """
+        Run write on a temporary file next to file_name with a progress dialog, then move it into place.
+
+        :return: True if the file was written completely.
+        """
+        progress_dialog = QProgressDialog(label, "Cancel", 0, total, self)
+        progress_dialog.setWindowTitle("Saving")
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        def report_progress(done: int, total: int) -> bool:
+            progress_dialog.setValue(done)
+            QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        # Write next to the target first so a cancelled save never clobbers an existing file
+        temp_name = file_name + '.part'
+        try:
+            with open(temp_name, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+                completed = write(f, report_progress)
+            if completed:
+                os.replace(temp_name, file_name)
+        except Exception as e:
+            logging.error(f"Error saving file {file_name}: {e}")
+            QMessageBox.critical(self, "Save Error", f"Could not save file: {e}")
+            completed = False
+        finally:
+            progress_dialog.close()
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+        return completed
+
+    def _export_snapshot_path(self) -> str:
+        """
+        Return the snapshot file of the last export from the current workspace roots.
+        """
+        key = hashlib.sha1(self.workspace.key.encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+        return os.path.join(self._data_directory(), 'exports', f"last_export-{key}.json")
+
+    def _save_export_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        try:
+            save_export_snapshot(self._export_snapshot_path(), snapshot)
+        except OSError as e:
+            logging.error(f"Error saving the export snapshot: {e}")
+
+    def export_shards(self) -> None:
+        """
+        Export the concatenated markdown as shards of a maximum size, with a manifest.
+        """
+        out_dir = QFileDialog.getExistingDirectory(self, "Select Shard Directory", QDir.currentPath())
+        if not out_dir:
+            return
+        max_size, ok = QInputDialog.getInt(
+            self, "Export Shards", f"Maximum shard size ({self.budget_unit}):",
+            self.settings.value('shard_max_size', 512 * 1024, type=int), 1, 2 ** 31 - 1)
+        if not ok:
+            return
+        self.settings.setValue('shard_max_size', max_size)
+
+        file_paths = self.model.get_checked_files()
+        progress_dialog = QProgressDialog("Exporting shards...", "Cancel", 0, len(file_paths), self)
+        progress_dialog.setWindowTitle("Exporting")
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        def report_progress(done: int, total: int) -> bool:
+            progress_dialog.setValue(done)
+            QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        try:
+            manifest = export_shards(file_paths, out_dir, max_size, self.budget_unit, 'markdown',
+                                     self.content_cache, self.read_workers, self.max_file_kb * 1024,
+                                     report_progress)
+        except Exception as e:
+            logging.error(f"Error exporting shards to {out_dir}: {e}")
+            QMessageBox.critical(self, "Export Error", f"Could not export shards: {e}")
+            return
+        finally:
+            progress_dialog.close()
+        if manifest is not None:
+            QMessageBox.information(self, "Exported", f"{len(manifest['shards'])} shards saved to {out_dir}.")
 
     def change_root_directory(self) -> None:
         """
-        Change the root directory of the file system model.
+        Replace the open root directories with a single one.
         """
         directory = QFileDialog.getExistingDirectory(self, "Select Root Directory", QDir.currentPath())
         if directory:
-            self.model.setRootPath(directory)
-            proxy_root_index = self.proxy_model.mapFromSource(self.model.index(directory))
-            self.tree.setRootIndex(proxy_root_index)
-            self.update_text()
+            self.set_roots([directory])
+
+    def add_root_directory(self) -> None:
+        """
+        Open another root directory in the same tree and concatenation.
+        """
+        directory = QFileDialog.getExistingDirectory(self, "Add Root Directory", self.workspace.common_root)
+        if directory:
+            self.set_roots(self.workspace.roots + [directory])
+
+    def remove_root_directory(self) -> None:
+        """
+        Close one of several open root directories.
+        """
+        if len(self.workspace.roots) < 2:
+            QMessageBox.information(self, "Remove Root Directory", "The only root directory cannot be removed.")
+            return
+        root, ok = QInputDialog.getItem(self, "Remove Root Directory", "Root directory:",
+                                        self.workspace.roots, 0, False)
+        if ok and root:
+            self.set_roots([other for other in self.workspace.roots if other != root])
+
+    def set_roots(self, roots: List[str]) -> None:
+        """
+        Open a new set of root directories, keeping the selection of each set apart.
+
+        Checked files that lie inside the new roots stay checked, ahead of the files
+        restored from the last time the new set was open.
+
+        :param roots: Root directories; roots inside another one are dropped.
+        """
+        workspace = Workspace(roots)
+        if workspace.roots == self.workspace.roots:
+            return
+        self._save_selection()
+        kept = [file_path for file_path in self.model.get_checked_files_in_selection_order()
+                if workspace.root_of(file_path) is not None]
+        self.model.set_checked_many(list(self.model.checked_files), Qt.Unchecked)
+        self._apply_workspace(workspace)
+        self.model.set_checked_many(kept, Qt.Checked)
+        self._restore_selection()
+        self.update_text()
+
+    def _apply_workspace(self, workspace: Workspace) -> None:
+        """
+        Point the model, the tree and the chunk headers at the roots of a workspace.
+        """
+        self.workspace = workspace
+        # A render in flight reads and names files under the previous roots; let it stop first
+        if self._render_task is not None:
+            self._render_task.cancel()
+            self._render_task = None
+        self.render_pool.waitForDone()
+        set_workspace(workspace)
+        # Chunks cached under the previous roots are never returned again; free them
+        self.content_cache.clear()
+        self.model.workspace = workspace
+        self.model.setRootPath(workspace.common_root)
+        self.proxy_model.set_workspace(workspace)
+        self._update_ignore_matcher()
+        self.tree.setRootIndex(self.proxy_model.mapFromSource(self.model.index(workspace.common_root)))
+        labels = ', '.join(workspace.labels[root] for root in workspace.roots)
+        self.setWindowTitle(f"File Concatenator - {labels}" if len(workspace.roots) > 1 else "File Concatenator")
+
+    def _update_ignore_matcher(self) -> None:
+        """
+        Rebuild the .gitignore rules for the current root directories and re-filter the tree.
+        """
+        matcher = None
+        if self.use_gitignore:
+            matcher = WorkspaceIgnoreMatcher(self.workspace, self.hidden_dirs)
+        self.proxy_model.set_ignore_matcher(matcher)
+        self.model.ignore_matcher = matcher
+        self.model.forget_scans()
 
     def open_settings_dialog(self) -> None:
         """
@@ -551,12 +1935,47 @@ class MainWindow(QMainWindow):
             self,
             current_font_size=self.font_size,
             current_theme=self.theme,
-            current_extensions=self.extensions
+            current_extensions=self.extensions,
+            current_update_delay=self.update_delay,
+            current_expand_depth=self.expand_depth,
+            current_read_workers=self.read_workers,
+            current_max_file_kb=self.max_file_kb,
+            current_budget_enabled=self.budget_enabled,
+            current_budget_limit=self.budget_limit,
+            current_budget_unit=self.budget_unit,
+            current_budget_order=self.budget_order,
+            current_use_gitignore=self.use_gitignore,
+            current_max_watched_files=self.max_watched_files,
+            current_log_level=self.log_level,
+            current_dedup=self.dedup
         )
         if dialog.exec_() == QDialog.Accepted:
             new_settings = dialog.get_settings()
             self.font_size = new_settings['font_size']
             self.theme = new_settings['theme']
+            self.update_delay = new_settings['update_delay_ms']
+            self.expand_depth = new_settings['startup_expand_depth']
+            self.read_workers = new_settings['read_workers']
+            if new_settings['max_file_kb'] != self.max_file_kb:
+                # Cached chunks were excerpted with the old limit
+                self.max_file_kb = new_settings['max_file_kb']
+                self.content_cache.clear()
+                if self.index is not None:
+                    self.index.clear_chunks()
+            self.budget_enabled = new_settings['budget_enabled']
+            self.budget_limit = new_settings['budget_limit']
+            self.budget_order = new_settings['budget_order']
+            self.dedup = new_settings['dedup']
+            if new_settings['budget_unit'] != self.budget_unit:
+                self.budget_unit = new_settings['budget_unit']
+                self.budget_meter = BudgetMeter(self.budget_unit)
+            if new_settings['use_gitignore'] != self.use_gitignore:
+                self.use_gitignore = new_settings['use_gitignore']
+                self._update_ignore_matcher()
+            self.max_watched_files = new_settings['max_watched_files']
+            self.file_watcher.max_files = self.max_watched_files
+            self.log_level = new_settings['log_level']
+            logging.getLogger().setLevel(self.log_level)
             new_extensions = new_settings.get('file_extensions', self.extensions)
 
             # Update extensions in settings
@@ -571,6 +1990,18 @@ class MainWindow(QMainWindow):
             # Save other settings
             self.settings.setValue('font_size', self.font_size)
             self.settings.setValue('theme', self.theme)
+            self.settings.setValue('update_delay_ms', self.update_delay)
+            self.settings.setValue('startup_expand_depth', self.expand_depth)
+            self.settings.setValue('read_workers', self.read_workers)
+            self.settings.setValue('max_file_kb', self.max_file_kb)
+            self.settings.setValue('budget_enabled', self.budget_enabled)
+            self.settings.setValue('budget_limit', self.budget_limit)
+            self.settings.setValue('budget_unit', self.budget_unit)
+            self.settings.setValue('budget_order', self.budget_order)
+            self.settings.setValue('use_gitignore', self.use_gitignore)
+            self.settings.setValue('max_watched_files', self.max_watched_files)
+            self.settings.setValue('log_level', self.log_level)
+            self.settings.setValue('dedup', self.dedup)
 
             # Update the text view after changing extensions
             self.update_text()
@@ -582,6 +2013,9 @@ class MainWindow(QMainWindow):
         # Apply font size
         self.markdown_view.set_font_size(self.font_size)
 
+        # Apply update delay
+        self.update_scheduler.set_delay(self.update_delay)
+
         # Apply theme
         self.apply_theme()
 
@@ -597,42 +2031,162 @@ class MainWindow(QMainWindow):
     def update_text(self) -> None:
         """
         Update the concatenated text in the markdown view based on checked files.
+
+        The files are read and rendered by a RenderTask on the render pool; any
+        render still in flight is cancelled and its result discarded.
+        """
+        if self._render_task is not None:
+            self._render_task.cancel()
+        self._render_generation += 1
+        if self.budget_enabled:
+            file_paths = self.model.get_checked_files_in_selection_order()
+            budget = Budget(self.budget_limit, self.budget_unit, self.budget_order)
+        else:
+            file_paths = self.model.get_checked_files()
+            budget = None
+        task = RenderTask(self._render_generation, file_paths, self.content_cache,
+                          plain_text_threshold=self.preview_plain_text_mb * 1024 * 1024,
+                          render_cache=self.render_cache, workers=self.read_workers,
+                          max_file_bytes=self.max_file_kb * 1024, budget=budget, meter=self.budget_meter,
+                          profile=self._profile_next, dedup=self.dedup, search_index=self.search_index)
+        self._profile_next = False
+        task.signals.finished.connect(self.on_render_finished)
+        task.signals.failed.connect(self.on_render_failed)
+        self._render_task = task
+        self._render_started = time.perf_counter()
+        self.statusBar().showMessage("Rendering\u2026")
+        self.render_pool.start(task)
+        # Most recently checked files are watched first when the selection exceeds the cap
+        self.file_watcher.sync(self.model.get_checked_files_in_selection_order()[::-1])
+
+    def on_watched_files_changed(self, file_paths: List[str]) -> None:
         """
-        self.markdown_content, self.plain_text_content = concatenate_files(self.model.get_checked_files())
-        html_content = markdown.markdown(self.markdown_content, extensions=['fenced_code'])
-        self.markdown_view.set_html_content(html_content)
+        Refresh the preview after checked files changed on disk.
 
-# ----------------------------
-# Utilities
-# ----------------------------
+        Only the changed files are dropped from the content cache, so the rebuild
+        re-reads just those; deleted files are unchecked.
 
-def concatenate_files(file_paths: List[str]) -> Tuple[str, str]:
-    """
-    Concatenate the contents of the given files into markdown and plain text formats.
+        :param file_paths: Paths reported by the file watcher.
+        """
+        for file_path in file_paths:
+            self.content_cache.evict(file_path)
+        deleted = [path for path in file_paths if not os.path.exists(path)]
+        if deleted:
+            self.model.set_checked_many(deleted, Qt.Unchecked)
+        self.update_scheduler.schedule()
+
+    def on_render_finished(self, generation: int, markdown_content: str, plain_text_content: str,
+                           sections: List[Tuple[str, str]], is_html: bool, summary: Dict[str, Any]) -> None:
+        """
+        Swap in the result of a finished render unless a newer one has been requested.
+        """
+        if generation != self._render_generation:
+            return
+        self._render_task = None
+        self.markdown_content = markdown_content
+        self.plain_text_content = plain_text_content
+        stats: PipelineStats = summary.get('stats') or PipelineStats()
+        with stats.timer('layout'):
+            if is_html:
+                self.markdown_view.set_html_sections(sections)
+            else:
+                self.markdown_view.set_plain_sections(sections)
+        stats.add_time('total', time.perf_counter() - self._render_started)
+        self.update_size_label(summary)
+        self.update_stats_label(generation, stats)
+        self.search_panel.refresh()
+        self.statusBar().clearMessage()
+        if 'profile' in summary:
+            self.show_profile(summary['profile'])
+
+    def on_render_failed(self, generation: int, error: str) -> None:
+        """
+        Stop waiting for a render that raised, keeping the previous preview.
+        """
+        if generation != self._render_generation:
+            return
+        self._render_task = None
+        self.statusBar().showMessage(f"Rendering failed: {error}", 10000)
 
-    :param file_paths: List of file paths to concatenate.
-    :return: A tuple containing markdown content and plain text content.
-    """
-    markdown_content = ''
-    plain_text_content = ''
-    for file_path in file_paths:
-        if file_path.endswith('explorer.py'):
-            continue
-        rel_path = os.path.relpath(file_path)
-        file_ext = os.path.splitext(file_path)[1]
-        language = get_language_from_extension(file_ext)
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-                file_content = file_content or "TODO"
-        except Exception as e:
-            logging.error(f"Error reading file {file_path}: {e}")
-            continue  # Skip this file
-        # Append markdown
-        markdown_content += f"## `{rel_path}`\n```{language}\n{file_content}\n```\n\n"
-        # Append plain text
-        plain_text_content += f"{rel_path}\n{file_content}\n\n"
-    return markdown_content, plain_text_content
+    def on_search_hit(self, file_path: str, line: int, query: str) -> None:
+        """
+        Jump to the preview section of a search hit and select the match.
+        """
+        section = self.markdown_view.section_of(display_path(file_path))
+        if section < 0:
+            self.statusBar().showMessage(f"{display_path(file_path)} is not in the preview", 3000)
+            return
+        self.tab_widget.setCurrentWidget(self.markdown_view)
+        self.markdown_view.jump_to_match(section, line, query)
+
+    def update_stats_label(self, generation: int, stats: PipelineStats) -> None:
+        """
+        Show the time and work of the last rebuild, with a per-stage breakdown in the tooltip.
+
+        :param generation: Generation number of the rebuild.
+        :param stats: Stage timings and counters of the rebuild.
+        """
+        snapshot = stats.snapshot()
+        counters = snapshot['counters']
+        self.stats_label.setText(f"Rebuild: {snapshot['timings_ms'].get('total', 0):.0f} ms, "
+                                 f"{counters.get('files_read', 0)} read, {counters.get('cache_hits', 0)} cached")
+        self.stats_label.setToolTip(stats.format().replace(' | ', '\n'))
+        logging.info(f"Rebuild {generation}: {stats.format()}")
+
+    def profile_next_rebuild(self) -> None:
+        """
+        Rebuild the preview now with cProfile enabled on the render thread.
+        """
+        self._profile_next = True
+        self.update_scheduler.flush()
+        if not self._profile_next:
+            return
+        self.update_text()
+
+    def show_profile(self, profile: Dict[str, str]) -> None:
+        """
+        Show the cProfile report of a rebuild.
+
+        :param profile: {'path': saved .prof file, 'text': formatted top entries}.
+        """
+        message_box = QMessageBox(self)
+        message_box.setWindowTitle("Rebuild Profile")
+        message_box.setText(f"Profile saved to {profile['path']}.\n"
+                            f"Open it with pstats or snakeviz, or see the details below.")
+        message_box.setDetailedText(profile['text'])
+        message_box.exec_()
+
+    def update_size_label(self, summary: Dict[str, Any]) -> None:
+        """
+        Show the running size of the selection, and the budget usage in budget mode.
+
+        :param summary: Size summary emitted by RenderTask.
+        """
+        if 'limit' in summary:
+            self.size_label.setText(
+                f"Budget: {summary['used']:,} / {summary['limit']:,} {summary['unit']}"
+                f" ({summary['total']:,} selected, {summary['omitted']} omitted, {summary['trimmed']} trimmed)")
+        elif 'total' in summary:
+            self.size_label.setText(f"Selected: {summary['total']:,} {summary['unit']}")
+
+    def closeEvent(self, event) -> None:
+        """
+        Cancel any in-flight render and folder walks, and save the selection before the window goes away.
+        """
+        if self._render_task is not None:
+            self._render_task.cancel()
+        self.render_pool.waitForDone()
+        self.model.cancel_scans()
+        self.model.scan_pool.waitForDone()
+        if self.index is not None:
+            self._save_selection()
+            try:
+                self.index.prune()
+            except Exception as e:
+                logging.error(f"Error pruning index: {e}")
+            self.index.close()
+            self.index = self.content_cache.index = self.render_cache.index = None
+        super().closeEvent(event)
 
 # ----------------------------
 # Controller
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import concatenator  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_workspace():
+    """
+    Undo set_workspace() calls (e.g. from main() with several roots) after each test.
+    """
+    yield
+    concatenator.set_workspace(None)
+
+
+@pytest.fixture
+def write():
+    """
+    Return a helper writing a UTF-8 file (creating its directory) and returning its '/' path.
+    """
+    def write_file(path, text: str = "x = 1\n") -> str:
+        os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+        with open(str(path), 'w', encoding='utf-8') as f:
+            f.write(text)
+        return str(path).replace(os.sep, '/')
+
+    return write_file
+
+
+@pytest.fixture
+def count_reads(monkeypatch):
+    """
+    Record the path of every file read through concatenator.read_file_text.
+    """
+    reads = []
+    original = concatenator.read_file_text
+
+    def counted(file_path, *args, **kwargs):
+        reads.append(file_path)
+        return original(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(concatenator, 'read_file_text', counted)
+    return reads
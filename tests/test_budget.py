@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from concatenator import Budget, BudgetMeter, measure
+
+
+def markdown_chunk(name: str, lines: int) -> str:
+    body = '\n'.join(f"line {i}" for i in range(lines))
+    return f"## `{name}`\n```python\n{body}\n```\n\n"
+
+
+@pytest.mark.parametrize('text, unit, expected', [
+    ('', 'tokens', 0),
+    ('abcd', 'tokens', 1),
+    ('abcde', 'tokens', 2),
+    ('abcde', 'bytes', 5),
+    ('é', 'bytes', 2),
+])
+def test_measure(text, unit, expected):
+    assert measure(text, unit) == expected
+
+
+@pytest.mark.parametrize('unit, order', [('lines', 'selection'), ('bytes', 'random')])
+def test_budget_rejects_unknown_settings(unit, order):
+    with pytest.raises(ValueError):
+        Budget(100, unit, order)
+
+
+def test_budget_packs_whole_files_and_trims_the_first_that_overflows():
+    chunks = [('a', markdown_chunk('a', 5)), ('b', markdown_chunk('b', 200)), ('c', markdown_chunk('c', 5))]
+    limit = len(chunks[0][1]) + 300
+    budget = Budget(limit, unit='bytes')
+    packed = list(budget.pack(chunks))
+    assert [path for path, _ in packed] == ['a', 'b']
+    assert packed[0][1] == chunks[0][1]
+    trimmed = packed[1][1]
+    assert trimmed.startswith("## `b`\n```python\nline 0\n")
+    assert trimmed.endswith(Budget.TRIM_MARKER + "\n```\n\n")
+    assert budget.used == sum(len(chunk) for _, chunk in packed) <= limit
+    assert (budget.included, budget.trimmed) == (2, 1)
+
+
+@pytest.mark.parametrize('limit, included, trimmed', [
+    (10 ** 6, 3, 0),
+    (30, 0, 0),
+])
+def test_budget_pack_counts(limit, included, trimmed):
+    chunks = [(name, markdown_chunk(name, 5)) for name in 'abc']
+    budget = Budget(limit, unit='bytes')
+    assert len(list(budget.pack(chunks))) == included
+    assert (budget.included, budget.trimmed) == (included, trimmed)
+
+
+@pytest.mark.parametrize('fmt, chunk, unit, room', [
+    ('markdown', markdown_chunk('a', 100), 'bytes', 120),
+    ('plain', "a\n" + '\n'.join(f"line {i}" for i in range(100)) + "\n\n", 'bytes', 120),
+    ('markdown', markdown_chunk('a', 100), 'tokens', 30),
+])
+def test_budget_trim_keeps_header_and_closing(fmt, chunk, unit, room):
+    budget = Budget(10 ** 6, unit=unit)
+    trimmed = budget._trim(chunk, fmt, room)
+    closing = "\n```\n\n" if fmt == 'markdown' else "\n\n"
+    assert trimmed is not None and measure(trimmed, unit) <= room
+    assert trimmed.endswith(Budget.TRIM_MARKER + closing)
+    assert chunk.startswith(trimmed[:-len(Budget.TRIM_MARKER + closing)] + '\n')
+
+
+def test_budget_trim_gives_up_when_only_the_header_fits():
+    budget = Budget(10 ** 6, unit='bytes')
+    assert budget._trim(markdown_chunk('a', 100), 'markdown', 40) is None
+
+
+def test_budget_order_files(tmp_path, write):
+    small = write(tmp_path / 'small.py', "s\n")
+    large = write(tmp_path / 'large.py', "l" * 100)
+    os.utime(small, (1, 1))
+    missing = str(tmp_path / 'missing.py')
+    paths = [large, missing, small]
+    assert Budget(1, order='selection').order_files(paths) == paths
+    assert Budget(1, order='size').order_files(paths) == [small, large, missing]
+    assert Budget(1, order='recency').order_files(paths) == [large, small, missing]
+
+
+def test_budget_meter_measures_only_new_chunks():
+    meter = BudgetMeter('bytes')
+    a, b = "aaaa", "bb"
+    assert meter.update([('a', a), ('b', b)]) == 6
+    assert meter.update([('a', a)]) == 4 and meter.total == 4
+    assert meter.update([('a', "a")]) == 1
@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from concatenator import main
+
+
+@pytest.fixture
+def tree(tmp_path, write, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write(tmp_path / 'proj' / 'a.py', "a = 1\n")
+    write(tmp_path / 'proj' / 'sub' / 'b.js', "let b = 2;\n")
+    write(tmp_path / 'proj' / 'notes.txt', "notes\n")
+    write(tmp_path / 'proj' / 'build' / 'gen.py', "generated = True\n")
+    write(tmp_path / 'proj' / '.gitignore', "build/\n")
+    write(tmp_path / 'other' / 'c.py', "a = 1\n")
+    return tmp_path
+
+
+def run(*args) -> str:
+    assert main([*args, '-o', 'out.txt']) == 0
+    with open('out.txt', encoding='utf-8') as f:
+        return f.read()
+
+
+CLI_CASES = [
+    # (arguments, expected in the output, not expected in the output)
+    (['proj'], ["## `proj/a.py`\n```python\na = 1\n", "## `proj/sub/b.js`\n```javascript"],
+     ['notes', 'generated']),
+    (['proj', '--format', 'plain'], ["proj/a.py\na = 1\n\n"], ['```']),
+    (['proj', '--include', '*.txt'], ["## `proj/notes.txt`"], ['a = 1']),
+    (['proj', '--hidden-dir', 'sub'], ["proj/a.py"], ['b.js']),
+    (['proj', '--no-gitignore'], ["## `proj/build/gen.py`"], []),
+    (['proj', 'other'], ["## `proj/a.py`", "## `other/c.py`"], []),
+    (['proj', 'other', '--dedup'], ["## `other/c.py`\n_Identical to `proj/a.py`._"], []),
+    (['proj', '--budget', '40', '--budget-unit', 'bytes'], ["## `proj/a.py`"], ['b.js']),
+    (['proj', '--language', '.txt=text', '--include', '*.txt'], ["```text\nnotes"], []),
+]
+
+
+@pytest.mark.parametrize('args, expected, unexpected', CLI_CASES)
+def test_main_output(tree, args, expected, unexpected):
+    output = run(*args)
+    for text in expected:
+        assert text in output
+    for text in unexpected:
+        assert text not in output
+
+
+@pytest.mark.parametrize('args', [['missing'], ['proj', 'missing'], ['proj/a.py']])
+def test_main_rejects_roots_that_are_not_directories(tree, capsys, args):
+    with pytest.raises(SystemExit) as raised:
+        main(args)
+    assert raised.value.code == 2
+    assert "not a directory" in capsys.readouterr().err
+
+
+def test_main_writes_shards(tree):
+    assert main(['proj', '--shards', 'shards', '--shard-size', '20']) == 0
+    with open(os.path.join('shards', 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert [len(shard['files']) for shard in manifest['shards']] == [1, 1]
+
+
+def test_main_delta_updates_the_snapshot(tree, write):
+    assert "2 added, 0 modified, 0 removed, 0 unchanged" in run('proj', '--delta', 'snapshot.json')
+    write(tree / 'proj' / 'a.py', "a = 2\n")
+    output = run('proj', '--delta', 'snapshot.json')
+    assert "0 added, 1 modified, 0 removed, 1 unchanged" in output
+    assert "a = 2" in output and "let b" not in output
+
+
+def test_main_since_outside_a_repository_fails(tree, monkeypatch):
+    monkeypatch.setenv('GIT_CEILING_DIRECTORIES', str(tree))
+    assert main(['proj', '--since', 'HEAD', '-o', 'out.txt']) == 2
@@ -0,0 +1,59 @@
+import pytest
+
+from concatenator import FileContentCache, concatenate_files, iter_file_chunks
+
+
+@pytest.fixture
+def files(tmp_path, write, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = {
+        'a': write(tmp_path / 'a.py', "same = 1\n"),
+        'b': write(tmp_path / 'b.py', "other = 2\n"),
+        'c': write(tmp_path / 'sub' / 'c.py', "same = 1\n"),
+        'd': write(tmp_path / 'd.py', "same = 1\n"),
+        'crlf': write(tmp_path / 'crlf.py', "same = 1\r\n"),
+        'big1': write(tmp_path / 'big1.py', "big\n" * 100),
+        'big2': write(tmp_path / 'big2.py', "big\n" * 100),
+    }
+    for name in ('bin1', 'bin2'):
+        (tmp_path / f"{name}.dat").write_bytes(b"\0\1\2")
+        paths[name] = str(tmp_path / f"{name}.dat")
+    return paths
+
+
+DEDUP_CASES = [
+    # (files in order, expected markdown chunk per file: None for the full content, else the original)
+    (['a', 'c'], [None, 'a.py']),
+    (['c', 'a'], [None, 'sub/c.py']),
+    (['a', 'b', 'c', 'd'], [None, None, 'a.py', 'a.py']),
+    (['a', 'crlf'], [None, 'a.py']),
+    (['bin1', 'bin2'], [None, None]),
+    (['big1', 'big2'], [None, None]),
+]
+
+
+@pytest.mark.parametrize('names, originals', DEDUP_CASES)
+def test_dedup_replaces_later_copies_with_a_reference(files, names, originals):
+    paths = [files[name] for name in names]
+    deduped = list(iter_file_chunks(paths, max_file_bytes=200, dedup=True))
+    full = list(iter_file_chunks(paths, max_file_bytes=200))
+    assert [file_path for file_path, _, _ in deduped] == paths
+    for (_, markdown_chunk, plain_chunk), (_, full_markdown, _), original in zip(deduped, full, originals):
+        if original is None:
+            assert markdown_chunk == full_markdown
+        else:
+            assert markdown_chunk.endswith(f"\n_Identical to `{original}`._\n\n")
+            assert plain_chunk.endswith(f"\n[identical to {original}]\n\n")
+
+
+def test_dedup_is_off_by_default(files):
+    markdown_content, plain_content = concatenate_files([files['a'], files['c']])
+    assert markdown_content.count("same = 1") == 2 and "Identical" not in markdown_content
+
+
+def test_dedup_with_a_warm_cache(files):
+    cache = FileContentCache()
+    paths = [files['a'], files['c']]
+    cold = concatenate_files(paths, cache, dedup=True)
+    assert concatenate_files(paths, cache, dedup=True) == cold
+    assert concatenate_files(paths, cache)[0].count("same = 1") == 2
@@ -0,0 +1,120 @@
+import io
+import os
+import subprocess
+
+import pytest
+
+from concatenator import IgnoreMatcher, delta_since_git_ref, delta_since_snapshot, write_concatenated
+
+
+def test_delta_since_snapshot(tmp_path, write, count_reads):
+    a = write(tmp_path / 'a.py', "a = 1\n")
+    b = write(tmp_path / 'b.py', "b = 1\n")
+    c = write(tmp_path / 'c.py', "c = 1\n")
+
+    delta, snapshot = delta_since_snapshot([a, b, c], {})
+    assert (delta.added, delta.modified, delta.removed, delta.unchanged) == ([a, b, c], [], [], 0)
+
+    count_reads.clear()
+    delta, snapshot = delta_since_snapshot([a, b, c], snapshot)
+    assert not delta and delta.unchanged == 3 and count_reads == []
+
+    # Touched without a content change
+    stat = os.stat(b)
+    os.utime(b, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    write(a, "a = 2\n")
+    os.remove(c)
+    d = write(tmp_path / 'd.py', "d = 1\n")
+    delta, snapshot = delta_since_snapshot([a, b, d], snapshot)
+    assert (delta.added, delta.modified, delta.removed, delta.unchanged) == ([d], [a], [c], 1)
+    assert delta.summary() == "1 added, 1 modified, 1 removed, 1 unchanged"
+    assert sorted(snapshot['files']) == [a, b, d]
+
+
+def test_delta_since_snapshot_unchecked_files_count_as_removed(tmp_path, write):
+    a = write(tmp_path / 'a.py')
+    b = write(tmp_path / 'b.py')
+    _, snapshot = delta_since_snapshot([a, b], {})
+    delta, _ = delta_since_snapshot([a], snapshot)
+    assert delta.removed == [b] and delta.unchanged == 1
+
+
+def test_write_concatenated_records_the_snapshot_it_wrote(tmp_path, write, count_reads):
+    a = write(tmp_path / 'a.py', "a = 1\n")
+    b = write(tmp_path / 'b.py', "b = 1\n")
+    binary = str(tmp_path / 'c.bin')
+    with open(binary, 'wb') as f:
+        f.write(b"\0")
+    missing = str(tmp_path / 'missing.py')
+    snapshot = {}
+    assert write_concatenated([a, missing, binary, b], io.StringIO(), snapshot=snapshot, workers=2)
+    assert sorted(snapshot['files']) == [a, b, binary]
+    assert snapshot['files'][binary]['hash'] == ''
+    _, expected = delta_since_snapshot([a, binary, b], {})
+    assert snapshot['files'] == expected['files']
+
+    count_reads.clear()
+    delta, _ = delta_since_snapshot([a, binary, b], snapshot)
+    assert not delta and delta.unchanged == 3 and count_reads == []
+
+
+def test_write_concatenated_cancelled_leaves_the_snapshot_empty(tmp_path, write):
+    paths = [write(tmp_path / f"{name}.py") for name in 'ab']
+    snapshot = {}
+    assert not write_concatenated(paths, io.StringIO(), progress=lambda done, total: False, snapshot=snapshot)
+    assert snapshot == {}
+
+
+def git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args], cwd=cwd,
+                   check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path, write):
+    root = os.path.realpath(str(tmp_path)).replace(os.sep, '/')
+    for relative in ('src/a.py', 'src/b.py', 'README.md', '.hidden/h.py', 'node_modules/n.py', 'build/g.py',
+                     'docs/keep.py', 'other/o.py'):
+        write(f"{root}/{relative}")
+    write(f"{root}/.gitignore", "build/\n")
+    git(root, 'init', '-q')
+    git(root, 'add', '-A', '-f')
+    git(root, 'commit', '-q', '-m', 'initial')
+    for relative in ('src/a.py', 'README.md', '.hidden/h.py', 'node_modules/n.py', 'build/g.py', 'docs/keep.py',
+                     'other/o.py'):
+        os.remove(f"{root}/{relative}")
+    write(f"{root}/src/b.py", "b = 2\n")
+    write(f"{root}/src/c.py")
+    return root
+
+
+GIT_REF_CASES = [
+    # (filters given to delta_since_git_ref, expected removed paths)
+    ({}, ['src/a.py']),
+    ({'roots': ['.']}, ['README.md', 'build/g.py', 'docs/keep.py', 'node_modules/n.py', 'other/o.py', 'src/a.py']),
+    ({'roots': ['.'], 'patterns': ['*.py']}, ['build/g.py', 'docs/keep.py', 'node_modules/n.py', 'other/o.py',
+                                             'src/a.py']),
+    ({'roots': ['.'], 'patterns': ['*.py'], 'hidden_dirs': ['node_modules']},
+     ['build/g.py', 'docs/keep.py', 'other/o.py', 'src/a.py']),
+    ({'roots': ['.'], 'patterns': ['*.py'], 'hidden_dirs': ['node_modules'], 'ignore': True},
+     ['docs/keep.py', 'other/o.py', 'src/a.py']),
+    ({'roots': ['src', 'docs'], 'patterns': ['*.py']}, ['docs/keep.py', 'src/a.py']),
+]
+
+
+@pytest.mark.parametrize('filters, removed', GIT_REF_CASES)
+def test_delta_since_git_ref_filters_removed_files(repo, filters, removed):
+    filters = dict(filters)
+    if 'roots' in filters:
+        filters['roots'] = [repo if root == '.' else f"{repo}/{root}" for root in filters['roots']]
+    if filters.get('ignore'):
+        filters['ignore'] = IgnoreMatcher(repo, filters.get('hidden_dirs', ()))
+    b, c = f"{repo}/src/b.py", f"{repo}/src/c.py"
+    delta = delta_since_git_ref([b, c], 'HEAD', **filters)
+    assert (delta.added, delta.modified, delta.unchanged) == ([c], [b], 0)
+    assert delta.removed == [os.path.join(repo, os.path.normpath(path)) for path in removed]
+
+
+def test_delta_since_git_ref_unknown_revision(repo):
+    with pytest.raises(ValueError, match="Unknown revision: nope"):
+        delta_since_git_ref([f"{repo}/src/b.py"], 'nope')
@@ -0,0 +1,58 @@
+import pytest
+
+import concatenator
+from concatenator import NameMatcher, get_language_from_extension, register_languages
+
+NAME_CASES = [
+    # (patterns, file name, matches)
+    (['*.py'], 'a.py', True),
+    (['*.py'], 'A.PY', True),
+    (['*.PY'], 'a.py', True),
+    (['*.py'], 'a.pyc', False),
+    (['*.py'], 'py', False),
+    (['*.py', '*.js'], 'b.js', True),
+    (['*.py', '*.js'], 'b.ts', False),
+    (['*.test.js'], 'a.test.js', True),
+    (['*.test.js'], 'a.js', False),
+    (['Makefile'], 'makefile', True),
+    (['Makefile'], 'Makefile.bak', False),
+    (['test_*.py'], 'test_a.py', True),
+    (['test_*.py'], 'a_test.py', False),
+    (['*.py', 'test_*'], 'test_data.json', True),
+    (['file?.txt'], 'file1.txt', True),
+    (['file?.txt'], 'file12.txt', False),
+    (['*.[ch]'], 'x.h', True),
+    (['*.[ch]'], 'x.o', False),
+    (['*'], 'anything', True),
+    ([], 'a.py', False),
+]
+
+
+@pytest.mark.parametrize('patterns, name, matches', NAME_CASES)
+def test_name_matcher(patterns, name, matches):
+    assert NameMatcher(patterns).matches(name) is matches
+
+
+@pytest.mark.parametrize('patterns, suffixes, has_regex', [
+    (['*.py', '*.JS'], ('.py', '.js'), False),
+    (['*.py', 'test_*'], ('.py',), True),
+    (['*', '*.[ch]'], (), True),
+])
+def test_name_matcher_uses_suffixes_for_plain_extensions(patterns, suffixes, has_regex):
+    matcher = NameMatcher(patterns)
+    assert matcher._suffixes == suffixes
+    assert (matcher._regex is not None) is has_regex
+
+
+@pytest.mark.parametrize('entries, ext, language', [
+    (['.ts=typescript'], '.ts', 'typescript'),
+    (['rs=rust'], '.rs', 'rust'),
+    (['.PY = py3'], '.py', 'py3'),
+    (['.md'], '.md', ''),
+    (['=nothing'], '', ''),
+])
+def test_register_languages(monkeypatch, entries, ext, language):
+    monkeypatch.setattr(concatenator, 'LANGUAGE_BY_EXTENSION', dict(concatenator.LANGUAGE_BY_EXTENSION))
+    register_languages(entries)
+    assert get_language_from_extension(ext) == language
+    assert get_language_from_extension(ext.upper()) == language
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from concatenator import IgnoreMatcher, compile_gitignore_line
+
+
+@pytest.mark.parametrize('line', ['', '\n', '# comment', '/', '   '])
+def test_compile_gitignore_line_skips_blank_and_comments(line):
+    assert compile_gitignore_line(line) is None
+
+
+GITIGNORE_CASES = [
+    # (.gitignore lines, relative path, is_dir, ignored)
+    (['build/'], 'build', True, True),
+    (['build/'], 'build', False, False),
+    (['build/'], 'src/build', True, True),
+    (['build/'], 'build/x.py', False, True),
+    (['/keep/*.py'], 'keep/a.py', False, True),
+    (['/keep/*.py'], 'keep/sub/a.py', False, False),
+    (['/keep/*.py'], 'src/keep/a.py', False, False),
+    (['/keep/*.py'], 'keep/a.js', False, False),
+    (['logs/**', '!logs/x.py'], 'logs', True, False),
+    (['logs/**', '!logs/x.py'], 'logs/a.txt', False, True),
+    (['logs/**', '!logs/x.py'], 'logs/x.py', False, False),
+    (['logs/**', '!logs/x.py'], 'logs/sub/x.py', False, True),
+    (['deep/**/b'], 'deep/b', False, True),
+    (['deep/**/b'], 'deep/x/b', False, True),
+    (['deep/**/b'], 'deep/x/y/b', True, True),
+    (['deep/**/b'], 'other/deep/b', False, False),
+    (['**/cache'], 'a/b/cache', True, True),
+    (['\\#hash'], '#hash', False, True),
+    (['#hash'], '#hash', False, False),
+    (['\\!bang'], '!bang', False, True),
+    (['*.log', '!important.log'], 'a/b.log', False, True),
+    (['*.log', '!important.log'], 'a/important.log', False, False),
+    (['build/', '!build/keep.py'], 'build/keep.py', False, True),
+    (['file?.py'], 'file1.py', False, True),
+    (['file?.py'], 'file10.py', False, False),
+    (['[abc].py'], 'b.py', False, True),
+    (['[!abc].py'], 'b.py', False, False),
+    (['[!abc].py'], 'd.py', False, True),
+    (['trailing\\ '], 'trailing ', False, True),
+    (['spaces   '], 'spaces', False, True),
+]
+
+
+@pytest.mark.parametrize('lines, relative, is_dir, ignored', GITIGNORE_CASES)
+def test_ignore_matcher_rules(tmp_path, write, lines, relative, is_dir, ignored):
+    write(tmp_path / '.gitignore', '\n'.join(lines) + '\n')
+    root = str(tmp_path).replace(os.sep, '/')
+    matcher = IgnoreMatcher(root)
+    assert matcher.is_ignored(f"{root}/{relative}", is_dir) is ignored
+
+
+def test_ignore_matcher_nested_gitignore_applies_below_its_directory(tmp_path, write):
+    write(tmp_path / 'sub' / '.gitignore', '*.tmp\n')
+    root = str(tmp_path).replace(os.sep, '/')
+    matcher = IgnoreMatcher(root)
+    assert matcher.is_ignored(f"{root}/sub/a.tmp", False)
+    assert matcher.is_ignored(f"{root}/sub/deeper/a.tmp", False)
+    assert not matcher.is_ignored(f"{root}/a.tmp", False)
+
+
+def test_ignore_matcher_hidden_dirs_and_disabled_gitignore(tmp_path, write):
+    write(tmp_path / '.gitignore', '*.py\n')
+    root = str(tmp_path).replace(os.sep, '/')
+    matcher = IgnoreMatcher(root, hidden_dirs=['node_modules'], use_gitignore=False)
+    assert matcher.is_ignored(f"{root}/web/node_modules", True)
+    assert not matcher.is_ignored(f"{root}/a.py", False)
+
+
+def test_ignore_matcher_reads_git_info_exclude(tmp_path, write):
+    write(tmp_path / '.git' / 'info' / 'exclude', 'local.py\n')
+    root = str(tmp_path).replace(os.sep, '/')
+    matcher = IgnoreMatcher(root)
+    assert matcher.is_ignored(f"{root}/local.py", False)
+    assert matcher.is_ignored(f"{root}/sub/local.py", False)
+
+
+def test_ignore_matcher_nested_negation_overrides_the_root(tmp_path, write):
+    write(tmp_path / '.gitignore', '*.gen.py\n')
+    write(tmp_path / 'keep' / '.gitignore', '!*.gen.py\n')
+    root = str(tmp_path).replace(os.sep, '/')
+    matcher = IgnoreMatcher(root)
+    assert matcher.is_ignored(f"{root}/a.gen.py", False)
+    assert not matcher.is_ignored(f"{root}/keep/a.gen.py", False)
+
+
+def test_ignore_matcher_invalidate_rereads_rules(tmp_path, write):
+    root = str(tmp_path).replace(os.sep, '/')
+    matcher = IgnoreMatcher(root)
+    assert not matcher.is_ignored(f"{root}/a.py", False)
+    write(tmp_path / '.gitignore', 'a.py\n')
+    assert not matcher.is_ignored(f"{root}/a.py", False)
+    matcher.invalidate()
+    assert matcher.is_ignored(f"{root}/a.py", False)
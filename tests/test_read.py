@@ -0,0 +1,67 @@
+import pytest
+
+import concatenator
+from concatenator import BINARY_SNIFF_BYTES, read_file_text
+
+LINES = b''.join(b"line %03d\n" % i for i in range(100))  # 900 bytes
+
+
+@pytest.mark.parametrize('data, max_bytes, expected', [
+    (b"a = 1\n", 1024, "a = 1\n"),
+    (b"a\r\nb\rc\n", 1024, "a\nb\nc\n"),
+    (b"", 1024, ""),
+    ("café\n".encode('utf-8'), 1024, "café\n"),
+    (LINES, 0, LINES.decode()),
+    (LINES, len(LINES), LINES.decode()),
+    (LINES, 100, "line 000\nline 001\nline 002\nline 003\nline 004\n"
+                 "\n... [truncated 810 of 900 bytes] ...\n\n"
+                 "line 095\nline 096\nline 097\nline 098\nline 099\n"),
+])
+def test_read_file_text(tmp_path, data, max_bytes, expected):
+    path = tmp_path / 'f.txt'
+    path.write_bytes(data)
+    assert read_file_text(str(path), max_bytes) == expected
+
+
+def test_read_file_text_truncation_drops_split_characters(tmp_path):
+    path = tmp_path / 'f.txt'
+    path.write_bytes("é".encode('utf-8') * 100)
+    text = read_file_text(str(path), 51)
+    assert "[truncated" in text and "�" not in text
+    assert set(text.split('\n')[0]) == {"é"}
+
+
+@pytest.mark.parametrize('data', [
+    b"\0",
+    b"text\0more",
+    b"x" * (BINARY_SNIFF_BYTES - 1) + b"\0",
+])
+def test_read_file_text_detects_binary(tmp_path, data):
+    path = tmp_path / 'f.bin'
+    path.write_bytes(data)
+    assert read_file_text(str(path)) is None
+
+
+def test_read_file_text_only_sniffs_the_head(tmp_path):
+    path = tmp_path / 'f.txt'
+    path.write_bytes(b"x" * BINARY_SNIFF_BYTES + b"\0")
+    assert read_file_text(str(path)) == "x" * BINARY_SNIFF_BYTES + "\0"
+
+
+def test_read_file_text_rejects_invalid_utf8(tmp_path):
+    path = tmp_path / 'f.txt'
+    path.write_bytes(b"\xff\xfe")
+    with pytest.raises(UnicodeDecodeError):
+        read_file_text(str(path))
+
+
+def test_binary_and_excerpted_files_are_rendered_without_a_hash(tmp_path):
+    binary = tmp_path / 'f.bin'
+    binary.write_bytes(b"\0" * 10)
+    large = tmp_path / 'large.py'
+    large.write_bytes(LINES)
+    chunks = concatenator._render_file_chunks(str(binary))
+    assert chunks[0].endswith("```\n[binary file omitted: 10 bytes]\n```\n\n") and chunks[2] == ''
+    chunks = concatenator._render_file_chunks(str(large), max_file_bytes=100)
+    assert "[truncated 810 of 900 bytes]" in chunks[0] and chunks[2] == ''
+    assert concatenator._render_file_chunks(str(large))[2]
@@ -0,0 +1,61 @@
+import pytest
+
+from concatenator import TrigramIndex
+
+FILES = {
+    '/r/a.py': "import os\n\ndef Render(x):\n    return os.path.join(x, 'y')\n",
+    '/r/b.py': "RENDER = True\nrender()\nrender(); render()\n",
+    '/r/c.js': "let x = 1;\n// ab\n",
+}
+
+
+@pytest.fixture
+def index():
+    index = TrigramIndex()
+    for file_path, text in FILES.items():
+        index.update(file_path, text)
+    return index
+
+
+SEARCH_CASES = [
+    # (query, expected hits)
+    ('render', [('/r/a.py', 3, 'def Render(x):'), ('/r/b.py', 1, 'RENDER = True'),
+                ('/r/b.py', 2, 'render()'), ('/r/b.py', 3, 'render(); render()')]),
+    ('os.path', [('/r/a.py', 4, "return os.path.join(x, 'y')")]),
+    ('import os', [('/r/a.py', 1, 'import os')]),
+    ('    return', [('/r/a.py', 4, "return os.path.join(x, 'y')")]),
+    ('ab', [('/r/c.js', 2, '// ab')]),
+    ('x', [('/r/a.py', 3, 'def Render(x):'), ('/r/a.py', 4, "return os.path.join(x, 'y')"),
+           ('/r/c.js', 1, 'let x = 1;')]),
+    ('(x', [('/r/a.py', 3, 'def Render(x):'), ('/r/a.py', 4, "return os.path.join(x, 'y')")]),
+    ('missing', []),
+    ('', []),
+]
+
+
+@pytest.mark.parametrize('query, hits', SEARCH_CASES)
+def test_trigram_index_search(index, query, hits):
+    assert index.search(query) == hits
+
+
+def test_trigram_index_search_limit(index):
+    assert len(index.search('render', limit=2)) == 2
+
+
+def test_trigram_index_sync_reindexes_only_changed_files(index):
+    texts = dict(FILES)
+    assert index.sync(texts.items()) == 0
+    texts['/r/b.py'] = "nothing here\n"
+    del texts['/r/c.js']
+    texts['/r/d.py'] = "render\n"
+    assert index.sync(texts.items()) == 2
+    assert len(index) == 3
+    assert [hit[0] for hit in index.search('render')] == ['/r/a.py', '/r/d.py']
+
+
+def test_trigram_index_update_and_remove(index):
+    index.update('/r/a.py', "nothing\n")
+    index.remove('/r/b.py')
+    index.remove('/r/missing.py')
+    assert index.search('render') == []
+    assert len(index) == 2
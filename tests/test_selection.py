@@ -0,0 +1,74 @@
+import pytest
+
+from concatenator import SelectionTrie
+
+
+def test_selection_trie_set_interface():
+    trie = SelectionTrie()
+    assert trie.add('/r/a.py', 10)
+    assert not trie.add('/r/a.py', 10)
+    trie.add('/r/sub/b.py', 5)
+    assert '/r/a.py' in trie and '/r/sub' not in trie
+    assert len(trie) == 2 and trie.selected_bytes == 15
+    assert trie.discard('/r/a.py') and not trie.discard('/r/a.py')
+    assert list(trie) == ['/r/sub/b.py']
+
+
+def test_selection_trie_iterates_in_sorted_path_order():
+    paths = ['/r/b/src/m.py', '/r/a/src/m.py', '/r/a.py', '/r/a-b/x.py', '/r/a/z.py', '/r/A/q.py']
+    trie = SelectionTrie()
+    for path in paths:
+        trie.add(path)
+    assert list(trie) == sorted(paths)
+
+
+def test_selection_trie_scan_and_subtree_counts():
+    trie = SelectionTrie()
+    trie.add('/r/d/a.py', 1)
+    assert trie.counts('/r/d') == (1, 1, 1, 1, False)
+    trie.scan('/r/d', [('/r/d/a.py', 1), ('/r/d/b.py', 2), ('/r/d/e/c.py', 4)])
+    assert trie.is_complete('/r/d/e') and not trie.is_complete('/r')
+    assert trie.counts('/r/d') == (1, 3, 1, 7, True)
+    assert sorted(trie.set_subtree('/r/d', True)) == ['/r/d/b.py', '/r/d/e/c.py']
+    assert trie.counts('/r') == (3, 3, 7, 7, False)
+    assert trie.set_subtree('/r/d/e', False) == ['/r/d/e/c.py']
+    assert trie.counts('/r/d/e') == (0, 1, 0, 4, True)
+
+
+def test_selection_trie_rescan_forgets_only_unchecked_missing_files():
+    trie = SelectionTrie()
+    trie.scan('/r', [('/r/a.py', 1), ('/r/b.py', 1)])
+    trie.add('/r/a.py', 1)
+    trie.scan('/r', [])
+    assert list(trie) == ['/r/a.py']
+    assert trie.counts('/r')[:2] == (1, 1)
+
+
+def test_selection_trie_retain_keeps_matching_checked_files():
+    trie = SelectionTrie()
+    trie.scan('/r', [('/r/a.py', 1), ('/r/b.js', 1)])
+    trie.set_subtree('/r', True)
+    trie.retain(lambda path: path.endswith('.py'))
+    assert list(trie) == ['/r/a.py']
+    assert not trie.is_complete('/r')
+
+
+FILES = [('/r/a.py', 1), ('/r/d/b.py', 2), ('/r/d/c.py', 4), ('/r/e/f/g.py', 8)]
+
+
+@pytest.mark.parametrize('checked, path, expected', [
+    ([], '/r', (0, 4, 0, 15, True)),
+    (['/r/a.py'], '/r', (1, 4, 1, 15, True)),
+    (['/r/a.py'], '/r/d', (0, 2, 0, 6, True)),
+    (['/r/d/b.py', '/r/d/c.py'], '/r/d', (2, 2, 6, 6, True)),
+    (['/r/e/f/g.py'], '/r/e', (1, 1, 8, 8, True)),
+    (['/r/e/f/g.py'], '/r/missing', (0, 0, 0, 0, True)),
+    (['/r/e/f/g.py'], '/', (1, 4, 8, 15, False)),
+])
+def test_selection_trie_counts_after_a_walk(checked, path, expected):
+    trie = SelectionTrie()
+    trie.scan('/r', FILES)
+    sizes = dict(FILES)
+    for file_path in checked:
+        trie.add(file_path, sizes[file_path])
+    assert trie.counts(path) == expected
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from concatenator import SHARD_MANIFEST, _load_manifest, export_shards, write_concatenated
+
+
+def read_shards(out_dir: str, manifest) -> str:
+    text = ''
+    for shard in manifest['shards']:
+        with open(os.path.join(out_dir, shard['name']), encoding='utf-8') as f:
+            text += f.read()
+    return text
+
+
+def concatenated(paths) -> str:
+    class Collect(list):
+        write = list.append
+
+    out = Collect()
+    write_concatenated(paths, out)
+    return ''.join(out)
+
+
+@pytest.fixture
+def letters(tmp_path, write, monkeypatch):
+    """
+    Files a.py to g.py of about 330 bytes of markdown each: two files per 700-byte shard.
+    """
+    monkeypatch.chdir(tmp_path)
+    return {name: write(tmp_path / f"{name}.py", f"{name} = '{name * 300}'\n") for name in 'abcdefg'}
+
+
+def test_export_shards_reuses_unchanged_shards(tmp_path, write, count_reads):
+    paths = [write(tmp_path / 'src' / f"f{i}.py", f"value_{i} = {'x' * 200}\n") for i in range(6)]
+    out_dir = str(tmp_path / 'out')
+    manifest = export_shards(paths, out_dir, 600, 'bytes')
+    names = [shard['name'] for shard in manifest['shards']]
+    assert len(names) > 1
+    assert [entry['path'] for shard in manifest['shards'] for entry in shard['files']] == paths
+    mtimes = {name: os.stat(os.path.join(out_dir, name)).st_mtime_ns for name in names}
+
+    count_reads.clear()
+    assert export_shards(paths, out_dir, 600, 'bytes') == manifest
+    assert count_reads == []
+
+    write(paths[-1], "changed = True\n")
+    count_reads.clear()
+    manifest = export_shards(paths, out_dir, 600, 'bytes')
+    assert paths[0] not in count_reads and paths[-1] in count_reads
+    assert os.stat(os.path.join(out_dir, names[0])).st_mtime_ns == mtimes[names[0]]
+    with open(os.path.join(out_dir, manifest['shards'][-1]['name']), encoding='utf-8') as f:
+        assert "changed = True" in f.read()
+
+
+def test_export_shards_removes_leftover_shards(tmp_path, write):
+    paths = [write(tmp_path / 'src' / f"f{i}.py", 'y' * 300) for i in range(4)]
+    out_dir = str(tmp_path / 'out')
+    first = export_shards(paths, out_dir, 400, 'bytes')
+    second = export_shards(paths[:1], out_dir, 400, 'bytes')
+    assert len(second['shards']) == 1 < len(first['shards'])
+    assert sorted(os.listdir(out_dir)) == sorted([second['shards'][0]['name'], SHARD_MANIFEST])
+
+
+@pytest.mark.parametrize('settings', [
+    (700, 'bytes', 'markdown'),
+    (800, 'bytes', 'markdown'),
+])
+def test_export_shards_cancel_then_re_export(letters, settings):
+    paths = list(letters.values())
+    without_c = [path for path in paths if path != letters['c']]
+    export_shards(paths, 'out', 700, 'bytes')
+    assert [len(shard['files']) for shard in _load_manifest('out')['shards']] == [2, 2, 2, 1]
+
+    # Overwrite shard-0002 with d and e, then cancel at the last file
+    cancelled = export_shards(without_c, 'out', *settings, progress=lambda done, total: done < total)
+    assert cancelled is None
+    manifest = _load_manifest('out')
+    for shard in manifest['shards']:
+        with open(os.path.join('out', shard['name']), encoding='utf-8') as f:
+            assert f.read() == concatenated([entry['path'] for entry in shard['files']])
+
+    manifest = export_shards(paths, 'out', 700, 'bytes')
+    assert read_shards('out', manifest) == concatenated(paths)
+
+
+def test_export_shards_cancel_before_writing_keeps_the_manifest(letters):
+    paths = list(letters.values())
+    manifest = export_shards(paths, 'out', 700, 'bytes')
+    assert export_shards(paths[:-1], 'out', 700, 'bytes', progress=lambda done, total: False) is None
+    assert _load_manifest('out') == manifest
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import concatenator
+from concatenator import FileContentCache, PersistentIndex, Workspace, iter_file_chunks, set_workspace
+
+
+def test_workspace_labels_and_display_paths(tmp_path):
+    root = str(tmp_path).replace(os.sep, '/')
+    workspace = Workspace([f"{root}/one/lib", f"{root}/two/lib", f"{root}/app", f"{root}/app/nested"])
+    assert workspace.roots == [f"{root}/one/lib", f"{root}/two/lib", f"{root}/app"]
+    assert workspace.labels == {f"{root}/one/lib": 'one/lib', f"{root}/two/lib": 'two/lib', f"{root}/app": 'app'}
+    assert workspace.display_path(f"{root}/two/lib/x.py") == os.path.join('two', 'lib', 'x.py')
+    assert workspace.common_root == root
+    assert workspace.is_ancestor(f"{root}/one") and not workspace.is_ancestor(f"{root}/app/src")
+    assert Workspace([f"{root}/app"]).display_path(f"{root}/app/src/m.py") == os.path.join('src', 'm.py')
+
+
+@pytest.mark.parametrize('roots, path, root', [
+    (['/w/a', '/w/b'], '/w/a/x.py', '/w/a'),
+    (['/w/a', '/w/b'], '/w/b', '/w/b'),
+    (['/w/a', '/w/b'], '/w/ab/x.py', None),
+    (['/w/a', '/w/b'], '/w', None),
+    (['/w/a/', '/w/a/b'], '/w/a/b/c.py', '/w/a'),
+])
+def test_workspace_root_of(roots, path, root):
+    assert Workspace(roots).root_of(path) == root
+
+
+def test_workspace_scan_walks_every_root(tmp_path, write):
+    root = str(tmp_path).replace(os.sep, '/')
+    a = write(tmp_path / 'one' / 'a.py')
+    b = write(tmp_path / 'two' / 'b.py')
+    write(tmp_path / 'two' / 'skip' / 'c.py')
+    write(tmp_path / 'two' / '.gitignore', "skip/\n")
+    write(tmp_path / 'outside.py')
+    workspace = Workspace([f"{root}/one", f"{root}/two"])
+    assert [path for path, _ in workspace.scan(['*.py'], [])] == [a, b]
+    assert len(workspace.scan(['*.py'], [], use_gitignore=False)) == 3
+
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_chunks_are_cached_per_workspace(tmp_path, write, monkeypatch, persistent):
+    monkeypatch.chdir(tmp_path)
+    root = str(tmp_path).replace(os.sep, '/')
+    path = write(tmp_path / 'one' / 'a.py')
+    write(tmp_path / 'two' / 'b.py')
+    index = PersistentIndex(str(tmp_path / 'index.sqlite3')) if persistent else None
+    cache = FileContentCache(index=index)
+    assert next(iter_file_chunks([path], cache))[1].startswith("## `one/a.py`")
+    set_workspace(Workspace([f"{root}/one", f"{root}/two"]))
+    if persistent:
+        cache = FileContentCache(index=index)
+    assert next(iter_file_chunks([path], cache))[1].startswith("## `one/a.py`")
+    set_workspace(Workspace([f"{root}/one"]))
+    assert next(iter_file_chunks([path], cache))[1].startswith("## `a.py`")
+    if index is not None:
+        index.close()
+
+
+def test_workspace_switch_during_a_read_keeps_the_old_names_under_the_old_key(tmp_path, write, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = str(tmp_path).replace(os.sep, '/')
+    path = write(tmp_path / 'one' / 'a.py')
+    old, new = Workspace([f"{root}/one", f"{root}/two"]), Workspace([f"{root}/one"])
+    index = PersistentIndex(str(tmp_path / 'index.sqlite3'))
+    cache = FileContentCache(index=index)
+    original = concatenator.read_file_text
+
+    def read_then_switch(file_path, *args, **kwargs):
+        set_workspace(new)
+        return original(file_path, *args, **kwargs)
+
+    set_workspace(old)
+    monkeypatch.setattr(concatenator, 'read_file_text', read_then_switch)
+    assert next(iter_file_chunks([path], cache))[1].startswith("## `one/a.py`")
+    monkeypatch.setattr(concatenator, 'read_file_text', original)
+    stat = os.stat(path)
+    assert cache.get(path, stat.st_mtime_ns, stat.st_size) is None
+    assert index.get_chunks(path, stat.st_mtime_ns, stat.st_size) is None
+    assert index.get_chunks(path, stat.st_mtime_ns, stat.st_size, old.key)[0].startswith("## `one/a.py`")
+    assert next(iter_file_chunks([path], cache))[1].startswith("## `a.py`")
+    index.close()